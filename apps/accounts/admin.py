@@ -2,13 +2,13 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.utils.translation import gettext, gettext_lazy as _
 from accounts.models import CustomUser
-from projects.admin import CapacityInline
+from projects.admin import CapacityInline, CapacityPatternInline
 
 
 class CustomUserAdmin(UserAdmin):
     readonly_fields = ("updated_at",)
     model = CustomUser
-    inlines = [CapacityInline]
+    inlines = [CapacityPatternInline, CapacityInline]
 
     add_fieldsets = (
         (
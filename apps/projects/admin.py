@@ -1,7 +1,31 @@
-from django.contrib import admin
+import io
+from datetime import timedelta
+from urllib.parse import urlencode
+from django.contrib import admin, messages
+from django.contrib.admin.utils import unquote
+from django.core.exceptions import PermissionDenied
+from django.core.paginator import Paginator
+from django.db.models import Count, Max, Min, Q, Sum
+from django.http import Http404
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 from mptt.admin import DraggableMPTTAdmin
 from simple_history.admin import SimpleHistoryAdmin
-from projects.models import Location, Project, Activity, Leave, Resource, Capacity
+from projects.models import (
+    Location,
+    Project,
+    ProjectStats,
+    Activity,
+    Leave,
+    Resource,
+    Capacity,
+    CapacityPattern,
+)
+from projects.forms import TimesheetImportForm
+from projects.importers import TimesheetImporter
 
 
 class LocationAdmin(SimpleHistoryAdmin):
@@ -11,6 +35,7 @@ class LocationAdmin(SimpleHistoryAdmin):
 class LeaveAdmin(SimpleHistoryAdmin):
     exclude = ("user",)
     list_display = ("id", "user", "type", "date", "duration", "comment")
+    list_select_related = ("user",)
 
     def get_queryset(self, request):
         qs = super(LeaveAdmin, self).get_queryset(request)
@@ -24,7 +49,20 @@ class LeaveAdmin(SimpleHistoryAdmin):
         super().save_model(request, obj, form, change)
 
 
-class ActivityAdmin(SimpleHistoryAdmin):
+class ProjectAutocompleteMixin:
+    """
+        choix du projet à complétion automatique pour qui peut consulter les
+        projets, la vue de complétion de l'admin exigeant projects.view_project
+        (ou change_project) ; liste déroulante pour les autres
+    """
+
+    def get_autocomplete_fields(self, request):
+        if self.admin_site._registry[Project].has_view_permission(request):
+            return ("project",)
+        return ()
+
+
+class ActivityAdmin(ProjectAutocompleteMixin, SimpleHistoryAdmin):
     exclude = ("user",)
     list_display = (
         "id",
@@ -37,6 +75,8 @@ class ActivityAdmin(SimpleHistoryAdmin):
         "is_business_trip",
         "location",
     )
+    # libellés des projets lus dans ProjectStats, voir Project.label_progression
+    list_select_related = ("user", "project__stats", "location")
 
     def get_queryset(self, request):
         qs = super(ActivityAdmin, self).get_queryset(request)
@@ -49,29 +89,55 @@ class ActivityAdmin(SimpleHistoryAdmin):
             obj.user = request.user
         super().save_model(request, obj, form, change)
 
+    def get_urls(self):
+        urls = [
+            path(
+                "import/",
+                self.admin_site.admin_view(self.import_view),
+                name="projects_activity_import",
+            )
+        ]
+        return urls + super().get_urls()
 
-class ActivityInline(admin.TabularInline):
-    model = Activity
-    fields = (
-        "id",
-        "user",
-        "project",
-        "date",
-        "duration",
-        "progression",
-        "is_teleworking",
-        "is_business_trip",
-        "location",
-    )
-    readonly_fields = fields
-    can_delete = False
-    extra = 0
+    def import_view(self, request):
+        if not request.user.is_superuser:
+            raise PermissionDenied
 
-    def get_queryset(self, request):
-        qs = super(ActivityInline, self).get_queryset(request)
-        if request.user.is_superuser:
-            return qs
-        return qs.filter(user=request.user)
+        form = TimesheetImportForm(request.POST or None, request.FILES or None)
+        if form.is_valid():
+            importer = TimesheetImporter(
+                form.cleaned_data["kind"], history_user=request.user
+            )
+            importer.run(
+                io.TextIOWrapper(form.cleaned_data["file"], encoding="utf-8-sig"),
+                delimiter=form.cleaned_data["delimiter"],
+            )
+            messages.success(
+                request,
+                "{} ligne(s) importée(s) ({:.0f} lignes/s).".format(
+                    importer.created, importer.rate
+                ),
+            )
+            for line, message in importer.errors[:20]:
+                messages.warning(request, "Ligne {} : {}".format(line, message))
+            if len(importer.errors) > 20:
+                messages.warning(
+                    request,
+                    "{} autre(s) ligne(s) rejetée(s).".format(
+                        len(importer.errors) - 20
+                    ),
+                )
+            return redirect("admin:projects_activity_changelist")
+
+        context = dict(
+            self.admin_site.each_context(request),
+            opts=self.model._meta,
+            form=form,
+            title="Import CSV",
+        )
+        return TemplateResponse(
+            request, "admin/projects/import_timesheets.html", context
+        )
 
 
 class ResourceInline(admin.TabularInline):
@@ -79,11 +145,126 @@ class ResourceInline(admin.TabularInline):
     fields = ("user", "project", "date", "duration", "comment")
     extra = 0
 
+    def get_queryset(self, request):
+        """
+            temps alloué sans date et réservations à venir : les réservations
+            passées restent dans la liste des ressources
+        """
+        return (
+            super()
+            .get_queryset(request)
+            .filter(Q(date__isnull=True) | Q(date__gte=timezone.now().today().date()))
+            .select_related("user", "project__stats")
+        )
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        """
+            liste des utilisateurs lue une fois par page plutôt qu'une fois par
+            ligne ; la validation se fait toujours sur la requête du champ
+        """
+        formfield = super().formfield_for_foreignkey(db_field, request, **kwargs)
+        if db_field.name == "user":
+            if not hasattr(request, "_resource_user_choices"):
+                request._resource_user_choices = list(formfield.choices)
+            formfield.choices = request._resource_user_choices
+        return formfield
+
 
 class ProjectAdmin(SimpleHistoryAdmin, DraggableMPTTAdmin):
     list_display = ("tree_actions", "indented_title", "comment", "id")
     list_display_links = ("indented_title",)
-    inlines = [ResourceInline, ActivityInline]
+    inlines = [ResourceInline]
+    # recherche des listes de choix à complétion automatique
+    search_fields = ("title",)
+    autocomplete_fields = ("parent",)
+    # activités du panneau chargé à la demande sur la page du projet
+    activities_per_page = 50
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("stats")
+
+    def get_urls(self):
+        urls = [
+            path(
+                "<path:object_id>/activities/",
+                self.admin_site.admin_view(self.activities_view),
+                name="projects_project_activities",
+            )
+        ]
+        return urls + super().get_urls()
+
+    def project_activities(self, request, project):
+        queryset = Activity.objects.filter(project=project)
+        if request.user.is_superuser:
+            return queryset
+        return queryset.filter(user=request.user)
+
+    def change_view(self, request, object_id, form_url="", extra_context=None):
+        """
+            la page du projet ne montre que le temps passé par utilisateur, sommé
+            par la base ; les activités sont chargées à la demande, page par page
+        """
+        extra_context = extra_context or {}
+        project = self.get_object(request, unquote(object_id))
+        if project is not None:
+            extra_context["activity_summary"] = (
+                self.project_activities(request, project)
+                .order_by()
+                .values("user__username")
+                .annotate(
+                    total=Sum("duration"),
+                    count=Count("pk"),
+                    first_date=Min("date"),
+                    last_date=Max("date"),
+                )
+                .order_by("-total")
+            )
+            extra_context["past_resource_count"] = Resource.objects.filter(
+                project=project, date__lt=timezone.now().today().date()
+            ).count()
+        return super().change_view(request, object_id, form_url, extra_context)
+
+    def activities_view(self, request, object_id):
+        project = self.get_object(request, unquote(object_id))
+        if project is None:
+            raise Http404
+        if not self.has_view_or_change_permission(request, project):
+            raise PermissionDenied
+
+        queryset = (
+            self.project_activities(request, project)
+            .select_related("user", "location")
+            .order_by("-date", "-id")
+        )
+        filters = {
+            "user": request.GET.get("user") or "",
+            "start": request.GET.get("start") or "",
+            "end": request.GET.get("end") or "",
+        }
+        if filters["user"]:
+            queryset = queryset.filter(user__username=filters["user"])
+        for name, lookup in (("start", "date__gte"), ("end", "date__lte")):
+            if filters[name]:
+                try:
+                    date = parse_date(filters[name])
+                except ValueError:
+                    date = None
+                if date is None:
+                    raise Http404("Date invalide.")
+                queryset = queryset.filter(**{lookup: date})
+
+        page = Paginator(queryset, self.activities_per_page).get_page(
+            request.GET.get("page")
+        )
+        context = {
+            "project": project,
+            "page_obj": page,
+            "filters": filters,
+            "query": urlencode({key: value for key, value in filters.items() if value}),
+        }
+        return TemplateResponse(
+            request, "admin/projects/project/activities.html", context
+        )
 
     def save_formset(self, request, form, formset, change):
         instances = formset.save(commit=False)
@@ -93,9 +274,10 @@ class ProjectAdmin(SimpleHistoryAdmin, DraggableMPTTAdmin):
         formset.save_m2m()
 
 
-class ResourceAdmin(SimpleHistoryAdmin):
+class ResourceAdmin(ProjectAutocompleteMixin, SimpleHistoryAdmin):
     exclude = ("user",)
     list_display = ("id", "user", "project", "date", "duration", "comment")
+    list_select_related = ("user", "project__stats")
 
     def get_queryset(self, request):
         qs = super(ResourceAdmin, self).get_queryset(request)
@@ -118,6 +300,7 @@ class CapacityInline(admin.TabularInline):
 class CapacityAdmin(SimpleHistoryAdmin):
     exclude = ("user",)
     list_display = ("id", "user", "date", "duration", "comment")
+    list_select_related = ("user",)
 
     def get_queryset(self, request):
         qs = super(CapacityAdmin, self).get_queryset(request)
@@ -131,9 +314,66 @@ class CapacityAdmin(SimpleHistoryAdmin):
         super().save_model(request, obj, form, change)
 
 
+class CapacityPatternInline(admin.TabularInline):
+    model = CapacityPattern
+    fields = ("valid_from", "valid_to") + CapacityPattern.WEEKDAYS + ("comment",)
+    extra = 0
+
+
+class CapacityPatternAdmin(SimpleHistoryAdmin):
+    exclude = ("user",)
+    list_display = ("id", "user", "valid_from", "valid_to", "weekly_total", "comment")
+
+    def weekly_total(self, obj):
+        return sum(obj.weekly(), timedelta())
+
+    weekly_total.short_description = "total hebdomadaire"
+
+    def get_queryset(self, request):
+        qs = super(CapacityPatternAdmin, self).get_queryset(request)
+        if request.user.is_superuser:
+            return qs
+        return qs.filter(user=request.user)
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            obj.user = request.user
+        super().save_model(request, obj, form, change)
+
+
+class ProjectStatsAdmin(admin.ModelAdmin):
+    list_display = (
+        "title",
+        "total_allotted",
+        "total_spent",
+        "total_remaining_allotted",
+        "total_remaining_needed",
+        "total_margin",
+        "allotted",
+        "spent",
+        "remaining_needed",
+        "margin",
+    )
+    list_select_related = ("project",)
+    list_filter = ("project__level",)
+    search_fields = ("project__title",)
+    readonly_fields = ("project",) + list_display[1:] + ("remaining_allotted",)
+
+    def title(self, obj):
+        return obj.project.title
+
+    title.short_description = "projet"
+    title.admin_order_field = "project__title"
+
+    def has_add_permission(self, request):
+        return False
+
+
 admin.site.register(Location, LocationAdmin)
 admin.site.register(Project, ProjectAdmin)
 admin.site.register(Activity, ActivityAdmin)
 admin.site.register(Leave, LeaveAdmin)
 admin.site.register(Resource, ResourceAdmin)
 admin.site.register(Capacity, CapacityAdmin)
+admin.site.register(CapacityPattern, CapacityPatternAdmin)
+admin.site.register(ProjectStats, ProjectStatsAdmin)
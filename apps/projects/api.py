@@ -0,0 +1,179 @@
+import hashlib
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+from django.views.generic import View
+from projects.exports import hours
+from projects.metrics_cache import cached_rollup
+from projects.models import Activity, Project, Resource
+from projects.snapshots import cached_dashboard, dashboard_version, data_version
+
+
+class JSONView(LoginRequiredMixin, View):
+    """
+        vue JSON en lecture seule avec ETag : l'empreinte des données est calculée
+        avant tout, une requête conditionnelle dont les données n'ont pas changé
+        reçoit un 304 sans que les indicateurs soient recalculés
+
+        Les sous-classes définissent get_version(request, **kwargs), empreinte
+        des données dont dépend la réponse, et get_data(request, **kwargs),
+        contenu de la réponse.
+    """
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        for name in ("get_version", "get_data"):
+            if not hasattr(cls, name):
+                raise ImproperlyConfigured(
+                    "{} doit définir {}().".format(cls.__name__, name)
+                )
+        return super().as_view(**initkwargs)
+
+    def get_etag(self, request, **kwargs):
+        version = repr((self.__class__.__name__, self.get_version(request, **kwargs)))
+        return hashlib.md5(version.encode()).hexdigest()
+
+    def get(self, request, **kwargs):
+        @condition(etag_func=self.get_etag)
+        def render(request, **kwargs):
+            return JsonResponse(
+                self.get_data(request, **kwargs), encoder=DjangoJSONEncoder
+            )
+
+        response = render(request, **kwargs)
+        # le client doit revalider à chaque fois, la revalidation coûte peu
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+
+class DashboardMixin:
+    """
+        le tableau de bord dépend des absences et capacités de l'utilisateur, des
+        activités et réservations de tous (la charge restante des projets) et du
+        jour courant
+    """
+
+    def get_start_date(self):
+        return timezone.now().today().date()
+
+    def get_version(self, request, **kwargs):
+        # gardée pour get_data(), qui n'a pas à la recalculer
+        self.version = dashboard_version(request.user, self.get_start_date())
+        return self.version
+
+    def get_dashboard(self, request):
+        return cached_dashboard(request.user, self.get_start_date(), self.version)
+
+
+class DashboardView(DashboardMixin, JSONView):
+    """
+        chiffres du tableau de bord (durées en heures)
+    """
+
+    def get_data(self, request, **kwargs):
+        context = self.get_dashboard(request)
+        return {
+            "date": context["start_date"],
+            "end_date": context["end_date"],
+            "balance_date": context["the_day_before"],
+            "balance": hours(context["balance"]),
+            "total_load": hours(context["total_load"]),
+            "next_available_date": context["next_available_date"],
+            "projects": [
+                {"title": title, "load": hours(load)}
+                for title, load in context["project_list"].items()
+            ],
+        }
+
+
+class PlanningView(DashboardMixin, JSONView):
+    """
+        planning jour par jour de l'utilisateur (durées en heures)
+    """
+
+    def get_data(self, request, **kwargs):
+        context = self.get_dashboard(request)
+        return {
+            "start_date": context["start_date"],
+            "end_date": context["end_date"],
+            "next_available_date": context["next_available_date"],
+            "days": [
+                {
+                    "date": date,
+                    "capacity": hours(capacity),
+                    "booked": hours(booked),
+                    "leave": hours(leave),
+                    "available": hours(available),
+                }
+                for date, capacity, booked, leave, available in zip(
+                    context["date_list"],
+                    context["capacity_list"],
+                    context["booked_list"],
+                    context["leave_list"],
+                    context["available_list"],
+                )
+            ],
+        }
+
+
+def project_metrics(project):
+    """
+        indicateurs d'un projet issu de cached_rollup(), cumuls compris
+    """
+    return {
+        "id": project.pk,
+        "parent": project.parent_id,
+        "title": project.title,
+        "level": project.level,
+        "allotted_time": hours(project.allotted_time),
+        "duration": hours(project.duration),
+        "progression": project.progression,
+        "total_allotted_time": hours(project.total_allotted_time),
+        "total": hours(project.total),
+        "total_progression": project.total_progression,
+        "total_remaining_time_allotted": hours(project.total_remaining_time_allotted),
+        "total_remaining_time_needed": hours(project.total_remaining_time_needed),
+        "total_margin": hours(project.total_margin),
+    }
+
+
+class ProjectMetricsMixin:
+    """
+        les indicateurs des projets dépendent des projets, des activités et des
+        réservations
+    """
+
+    def get_version(self, request, **kwargs):
+        return data_version(
+            Project.objects.all(), Activity.objects.all(), Resource.objects.all()
+        )
+
+
+class ProjectListView(ProjectMetricsMixin, JSONView):
+    """
+        indicateurs de tous les projets
+    """
+
+    def get_data(self, request, **kwargs):
+        projects = cached_rollup(Project.objects.root_nodes())
+        return {"projects": [project_metrics(project) for project in projects]}
+
+
+class ProjectDetailView(ProjectMetricsMixin, JSONView):
+    """
+        indicateurs d'un projet et de ses sous-projets
+    """
+
+    def get_version(self, request, **kwargs):
+        get_object_or_404(Project, id=kwargs["pk"])
+        return (kwargs["pk"], super().get_version(request, **kwargs))
+
+    def get_data(self, request, **kwargs):
+        project = get_object_or_404(Project, id=kwargs["pk"])
+        projects = cached_rollup([project])
+        return {"projects": [project_metrics(project) for project in projects]}
@@ -0,0 +1,150 @@
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth
+from projects.capacity import ONE_DAY, pattern_days
+from projects.models import Activity, BalanceCheckpoint, Capacity, Leave
+
+
+def next_month(date):
+    return (date.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def balance_querysets(user=None):
+    """
+        éléments du solde d'heures et leur signe : le travail et les absences (hors
+        récupération) s'ajoutent, la capacité se retranche
+    """
+    querysets = (
+        (Activity.objects.all(), 1),
+        (Leave.objects.exclude(type=Leave.RECUP), 1),
+        (Capacity.objects.all(), -1),
+    )
+    if user is None:
+        return querysets
+    return tuple((queryset.filter(user=user), sign) for queryset, sign in querysets)
+
+
+def contribution(instance):
+    """
+        contribution d'un objet « Activity » ou « Leave » au solde ; celle d'un
+        objet « Capacity » dépend des capacités hebdomadaires qu'il remplace, les
+        points de solde suivants sont alors oubliés (forget)
+    """
+    if isinstance(instance, Leave) and instance.type == Leave.RECUP:
+        return timedelta()
+    return instance.duration
+
+
+def period_balance(user, start, end):
+    """
+        écart du solde d'heures sur la période [start, end[ (depuis le début si
+        start est None)
+    """
+    total = timedelta()
+    for queryset, sign in balance_querysets(user):
+        if start is not None:
+            queryset = queryset.filter(date__gte=start)
+        total += sign * (
+            queryset.filter(date__lt=end).aggregate(total=Sum("duration"))["total"]
+            or timedelta()
+        )
+    # jours sans objet « Capacity » couverts par une capacité hebdomadaire
+    total -= sum(pattern_days([user], start, end - ONE_DAY).values(), timedelta())
+    return total
+
+
+def get_checkpoint(user, month):
+    """
+        point de solde du mois, créé à partir du précédent s'il n'existe pas encore
+    """
+    checkpoint = BalanceCheckpoint.objects.filter(user=user, month__lte=month).first()
+    if checkpoint is not None and checkpoint.month == month:
+        return checkpoint
+
+    with transaction.atomic():
+        if checkpoint is None:
+            balance = period_balance(user, None, month)
+        else:
+            balance = checkpoint.balance + period_balance(user, checkpoint.month, month)
+        checkpoint, created = BalanceCheckpoint.objects.get_or_create(
+            user=user, month=month, defaults={"balance": balance}
+        )
+    return checkpoint
+
+
+def get_balance(user, date):
+    """
+        solde d'heures de l'utilisateur à la fin du jour date : point de solde du
+        mois, complété par l'écart depuis le début du mois
+    """
+    month = date.replace(day=1)
+    checkpoint = get_checkpoint(user, month)
+    return (
+        user.start_balance
+        + checkpoint.balance
+        + period_balance(user, month, date + timedelta(days=1))
+    )
+
+
+def shift(user_id, date, delta):
+    """
+        reporte une variation du solde au jour date sur les points de solde suivants
+    """
+    if not delta:
+        return
+    with transaction.atomic():
+        checkpoints = list(
+            BalanceCheckpoint.objects.select_for_update().filter(
+                user_id=user_id, month__gt=date
+            )
+        )
+        for checkpoint in checkpoints:
+            checkpoint.balance += delta
+        BalanceCheckpoint.objects.bulk_update(checkpoints, ["balance"])
+
+
+def forget(user_id, date):
+    """
+        supprime les points de solde postérieurs au jour date, après une écriture
+        en masse ; ils seront recalculés à la demande
+    """
+    BalanceCheckpoint.objects.filter(user_id=user_id, month__gt=date).delete()
+
+
+def compute_checkpoints(users, until):
+    """
+        points de solde recalculés depuis le début, du premier mois renseigné
+        jusqu'au mois du jour until : {(user_id, mois): solde}
+    """
+    user_ids = [user.pk for user in users]
+    monthly = {}
+    for queryset, sign in balance_querysets():
+        rows = (
+            queryset.filter(user__in=user_ids, date__lt=next_month(until))
+            .order_by()
+            .values("user", month=TruncMonth("date"))
+            .annotate(total=Sum("duration"))
+            .values_list("user", "month", "total")
+        )
+        for user_id, month, total in rows:
+            by_month = monthly.setdefault(user_id, {})
+            by_month[month] = by_month.get(month, timedelta()) + sign * total
+
+    for (user_id, date), duration in pattern_days(
+        user_ids, None, next_month(until) - ONE_DAY
+    ).items():
+        by_month = monthly.setdefault(user_id, {})
+        month = date.replace(day=1)
+        by_month[month] = by_month.get(month, timedelta()) - duration
+
+    last_month = until.replace(day=1)
+    checkpoints = {}
+    for user_id, by_month in monthly.items():
+        month = min(by_month)
+        balance = timedelta()
+        while month <= last_month:
+            checkpoints[(user_id, month)] = balance
+            balance += by_month.get(month, timedelta())
+            month = next_month(month)
+    return checkpoints
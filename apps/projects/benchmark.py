@@ -0,0 +1,189 @@
+import platform
+import statistics
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+import django
+from django.conf import settings
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+from projects import urls
+from projects.models import Project
+
+# propriétés coûteuses de Project, évaluées sans annotation ni indicateurs
+# précalculés, comme le fait un gabarit qui reçoit des projets « nus »
+PROPERTIES = (
+    "allotted_time",
+    "duration",
+    "total",
+    "total_allotted_time",
+    "total_progression",
+    "total_remaining_time_needed",
+    "total_margin",
+)
+
+
+class QueryCounter:
+    """
+        compte les requêtes exécutées, sans les journaliser
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+@contextmanager
+def private_cache():
+    """
+        remplace le cache configuré, partagé avec l'application, par un cache
+        fichier vide dans un répertoire temporaire : les mesures ne vident ni ne
+        remplissent le cache de production
+    """
+    with tempfile.TemporaryDirectory() as location:
+        with override_settings(
+            CACHES={
+                "default": {
+                    "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                    "LOCATION": location,
+                    "OPTIONS": settings.CACHES["default"].get("OPTIONS", {}),
+                }
+            }
+        ):
+            yield
+
+
+def measure(func, repeat=5):
+    """
+        nombre de requêtes, durée et pic de mémoire de func()
+
+        Le premier appel se fait avec un cache vide, propre à la mesure ; les
+        durées sont celles des repeat appels suivants ; le pic de mémoire est
+        mesuré lors d'un appel à part, tracemalloc ralentissant l'exécution.
+    """
+    with private_cache():
+        return measure_calls(func, repeat)
+
+
+def measure_calls(func, repeat):
+    first = QueryCounter()
+    with connection.execute_wrapper(first):
+        start = time.perf_counter()
+        func()
+        first_time = time.perf_counter() - start
+
+    times = []
+    for i in range(repeat):
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            start = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        func()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "queries": counter.count,
+        "queries_first": first.count,
+        "time_first": first_time,
+        "time_min": min(times),
+        "time_median": statistics.median(times),
+        "time_max": max(times),
+        "peak_memory": peak,
+    }
+
+
+def url_cases(user, project):
+    """
+        une URL par vue de projects/urls.py, les paramètres étant pris dans
+        l'organisation : {nom: URL}
+    """
+    values = {
+        "username": user.username,
+        "pk": project.pk,
+        "kind": "activities",
+        "fmt": "csv",
+    }
+    cases = {}
+    for pattern in urls.urlpatterns:
+        kwargs = {name: values[name] for name in pattern.pattern.converters}
+        cases[pattern.name] = reverse(
+            "{}:{}".format(urls.app_name, pattern.name), kwargs=kwargs
+        )
+    return cases
+
+
+def get_page(client, url):
+    response = client.get(url)
+    if response.status_code != 200:
+        raise RuntimeError("{} : statut {}".format(url, response.status_code))
+    if response.streaming:
+        for chunk in response.streaming_content:
+            pass
+
+
+def get_property(name, tree_ids):
+    for project in Project.objects.filter(tree_id__in=tree_ids):
+        getattr(project, name)
+
+
+def run(organisation, repeat=5):
+    """
+        mesure toutes les vues de l'application et les propriétés coûteuses de
+        Project sur une organisation construite : {nom: mesures}
+    """
+    user = organisation.users[0]
+    project = organisation.projects[0]
+    tree_ids = {project.tree_id for project in organisation.projects}
+
+    client = Client()
+    client.force_login(user)
+
+    results = {}
+    for name, url in url_cases(user, project).items():
+        results["view:" + name] = dict(
+            measure(lambda: get_page(client, url), repeat), url=url
+        )
+    for name in PROPERTIES:
+        results["property:" + name] = dict(
+            measure(lambda: get_property(name, tree_ids), repeat),
+            projects=len(organisation.projects),
+        )
+    return results
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "database": connection.vendor,
+        "machine": platform.machine(),
+    }
+
+
+def compare(previous, current):
+    """
+        écarts entre deux résultats : [(nom, mesure, avant, après, rapport)], pour
+        les mesures présentes dans les deux
+    """
+    rows = []
+    for name, result in current.items():
+        if name not in previous:
+            continue
+        for key in ("queries", "time_median", "peak_memory"):
+            before, after = previous[name].get(key), result.get(key)
+            if before is None or after is None:
+                continue
+            ratio = after / before if before else None
+            rows.append((name, key, before, after, ratio))
+    return rows
@@ -0,0 +1,30 @@
+from django.core.cache import cache
+
+
+def stats_key(prefix, name):
+    return "{}:stats:{}".format(prefix, name)
+
+
+def count(prefix, name, value=1):
+    """
+        incrémente le compteur name des entrées de cache de préfixe prefix
+    """
+    key = stats_key(prefix, name)
+    try:
+        cache.incr(key, value)
+    except ValueError:
+        cache.set(key, value, None)
+
+
+def get_stats(prefix):
+    """
+        nombre d'entrées de préfixe prefix lues depuis le cache (hits) ou
+        recalculées (misses)
+    """
+    keys = [stats_key(prefix, "hits"), stats_key(prefix, "misses")]
+    values = cache.get_many(keys)
+    return {"hits": values.get(keys[0], 0), "misses": values.get(keys[1], 0)}
+
+
+def reset_stats(prefix):
+    cache.delete_many([stats_key(prefix, "hits"), stats_key(prefix, "misses")])
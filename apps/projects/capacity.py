@@ -0,0 +1,116 @@
+from datetime import timedelta
+from django.db.models import Count, Max, Q, Sum
+from projects.models import Capacity, CapacityPattern
+
+ONE_DAY = timedelta(days=1)
+
+# fin du planning d'un utilisateur dont la capacité hebdomadaire est sans fin
+PLANNING_HORIZON = timedelta(days=90)
+
+
+def daily_durations(queryset, start_date, end_date):
+    """
+        requête des durées sommées par utilisateur et par jour sur la période :
+        (user_id, date, total)
+    """
+    return (
+        queryset.filter(date__gte=start_date, date__lte=end_date)
+        .order_by()
+        .values("user", "date")
+        .annotate(total=Sum("duration"))
+        .values_list("user", "date", "total")
+    )
+
+
+def durations_by_user_date(queryset, start_date, end_date):
+    """
+        somme des durées par utilisateur et par jour sur la période :
+        {(user_id, date): durée}
+    """
+    rows = daily_durations(queryset, start_date, end_date)
+    return {(user_id, date): total for user_id, date, total in rows}
+
+
+def expand_patterns(users, start_date, end_date):
+    """
+        capacités hebdomadaires dépliées jour par jour sur la période, bornes
+        incluses (depuis le début de chaque modèle si start_date est None) :
+        {(user_id, date): durée}
+    """
+    patterns = CapacityPattern.objects.filter(user__in=users, valid_from__lte=end_date)
+    if start_date is not None:
+        patterns = patterns.filter(
+            Q(valid_to__isnull=True) | Q(valid_to__gte=start_date)
+        )
+
+    days = {}
+    # le modèle commençant le plus tard écrase les précédents
+    for pattern in patterns.order_by("valid_from", "created_at"):
+        weekly = pattern.weekly()
+        day = pattern.valid_from
+        if start_date is not None:
+            day = max(day, start_date)
+        last = end_date
+        if pattern.valid_to is not None:
+            last = min(last, pattern.valid_to)
+        while day <= last:
+            days[(pattern.user_id, day)] = weekly[day.weekday()]
+            day += ONE_DAY
+    return days
+
+
+def capacities_by_user_date(users, start_date, end_date):
+    """
+        capacité de chaque utilisateur chaque jour de la période : les objets
+        « Capacity » du jour, à défaut la capacité hebdomadaire en vigueur
+    """
+    capacities = expand_patterns(users, start_date, end_date)
+    capacities.update(
+        durations_by_user_date(
+            Capacity.objects.filter(user__in=users), start_date, end_date
+        )
+    )
+    return capacities
+
+
+def pattern_days(users, start_date, end_date):
+    """
+        jours de la période où seule la capacité hebdomadaire s'applique, faute
+        d'objet « Capacity » : {(user_id, date): durée}
+    """
+    days = expand_patterns(users, start_date, end_date)
+    if days:
+        explicit = Capacity.objects.filter(
+            user__in=users,
+            date__gte=min(date for user_id, date in days),
+            date__lte=end_date,
+        ).values_list("user", "date")
+        for key in explicit:
+            days.pop(key, None)
+    return days
+
+
+def last_capacity_dates(users, start_date):
+    """
+        dernier jour pour lequel la capacité de chaque utilisateur est connue :
+        dernier objet « Capacity » ou fin de la dernière capacité hebdomadaire,
+        start_date + PLANNING_HORIZON si elle est sans fin : {user_id: date}
+    """
+    last_dates = dict(
+        Capacity.objects.filter(user__in=users)
+        .order_by()
+        .values("user")
+        .annotate(last=Max("date"))
+        .values_list("user", "last")
+    )
+    rows = (
+        CapacityPattern.objects.filter(user__in=users)
+        .order_by()
+        .values("user")
+        .annotate(last=Max("valid_to"), open=Count("pk", filter=Q(valid_to=None)))
+    )
+    for row in rows:
+        last = start_date + PLANNING_HORIZON if row["open"] else row["last"]
+        if row["user"] not in last_dates or last_dates[row["user"]] < last:
+            last_dates[row["user"]] = last
+    return last_dates
@@ -0,0 +1,132 @@
+import csv
+from projects.models import Activity, Capacity, Leave
+
+CHUNK_SIZE = 2000
+
+
+def format_hours(td):
+    """
+        durée au format « H:MM », relu tel quel par l'import
+    """
+    minutes = int(td.total_seconds() // 60)
+    sign = "-" if minutes < 0 else ""
+    h, m = divmod(abs(minutes), 60)
+    return "{}{}:{:02d}".format(sign, h, m)
+
+
+def hours(td):
+    """
+        durée en heures décimales
+    """
+    return round(td.total_seconds() / 3600, 2)
+
+
+def activity_row(activity):
+    return [
+        activity.user.username,
+        activity.date.isoformat(),
+        format_hours(activity.duration),
+        activity.project_id,
+        activity.project.title,
+        activity.location_id,
+        activity.location.title,
+        "" if activity.progression is None else activity.progression,
+        int(activity.is_teleworking),
+        int(activity.is_business_trip),
+        activity.comment or "",
+    ]
+
+
+def leave_row(leave):
+    return [
+        leave.user.username,
+        leave.date.isoformat(),
+        format_hours(leave.duration),
+        leave.type,
+        leave.get_type_display(),
+        leave.comment or "",
+    ]
+
+
+def capacity_row(capacity):
+    return [
+        capacity.user.username,
+        capacity.date.isoformat(),
+        format_hours(capacity.duration),
+        capacity.comment or "",
+    ]
+
+
+# modèle, relations chargées avec chaque ligne, en-tête, mise en forme
+EXPORTS = {
+    "activities": (
+        Activity,
+        ("user", "project", "location"),
+        [
+            "user",
+            "date",
+            "duration",
+            "project",
+            "project_title",
+            "location",
+            "location_title",
+            "progression",
+            "is_teleworking",
+            "is_business_trip",
+            "comment",
+        ],
+        activity_row,
+    ),
+    "leaves": (
+        Leave,
+        ("user",),
+        ["user", "date", "duration", "type", "type_label", "comment"],
+        leave_row,
+    ),
+    "capacities": (
+        Capacity,
+        ("user",),
+        ["user", "date", "duration", "comment"],
+        capacity_row,
+    ),
+}
+
+
+def export_queryset(kind, user=None, project=None, start_date=None, end_date=None):
+    """
+        objets à exporter, filtrés par utilisateur, sous-arbre de projets (pour les
+        activités) et période (bornes incluses)
+    """
+    model, related, header, to_row = EXPORTS[kind]
+    queryset = model.objects.select_related(*related).order_by("date", "id")
+    if user is not None:
+        queryset = queryset.filter(user=user)
+    if project is not None and model is Activity:
+        queryset = queryset.filter(
+            project__in=project.get_descendants(include_self=True)
+        )
+    if start_date is not None:
+        queryset = queryset.filter(date__gte=start_date)
+    if end_date is not None:
+        queryset = queryset.filter(date__lte=end_date)
+    return queryset
+
+
+class Echo:
+    """
+        pseudo-fichier renvoyant ce qu'on y écrit, pour csv.writer
+    """
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(kind, queryset, chunk_size=CHUNK_SIZE, delimiter=","):
+    """
+        lignes CSV générées au fil de la lecture, par paquets de chunk_size objets
+    """
+    model, related, header, to_row = EXPORTS[kind]
+    writer = csv.writer(Echo(), delimiter=delimiter)
+    yield writer.writerow(header)
+    for obj in queryset.iterator(chunk_size=chunk_size):
+        yield writer.writerow(to_row(obj))
@@ -0,0 +1,16 @@
+from django import forms
+from projects.importers import TimesheetImporter
+
+
+class TimesheetImportForm(forms.Form):
+    kind = forms.ChoiceField(
+        choices=[
+            (kind, model._meta.verbose_name_plural.capitalize())
+            for kind, model in TimesheetImporter.MODELS.items()
+        ],
+        label="type de données",
+    )
+    file = forms.FileField(label="fichier CSV")
+    delimiter = forms.ChoiceField(
+        choices=[(",", "virgule"), (";", "point-virgule")], label="séparateur"
+    )
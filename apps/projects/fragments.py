@@ -0,0 +1,65 @@
+import hashlib
+from itertools import groupby
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+from projects import cache_stats
+
+KEY_PREFIX = "projects:fragments"
+TIMEOUT = 60 * 60 * 24 * 7
+WEEK_TEMPLATE = "projects/_activity_week.html"
+
+
+def iso_week(activity):
+    return activity.date.isocalendar()[:2]
+
+
+def week_key(user_id, week, activities):
+    """
+        clé d'une semaine : utilisateur, année et semaine ISO, dernière mise à jour
+        des activités affichées ; les identifiants des activités (suppression,
+        semaine coupée par la pagination) et la dernière mise à jour des projets
+        et localisations affichés complètent l'empreinte
+    """
+    latest = max(activity.updated_at for activity in activities)
+    related = max(
+        max(activity.project.updated_at, activity.location.updated_at)
+        for activity in activities
+    )
+    digest = hashlib.md5(
+        repr((latest, related, [activity.pk for activity in activities])).encode()
+    ).hexdigest()
+    return "{}:week:{}:{}-{:02d}:{}".format(
+        KEY_PREFIX, user_id, week[0], week[1], digest
+    )
+
+
+def activity_weeks(user, activities):
+    """
+        fragments HTML du relevé d'heures, un par semaine ISO des activités
+        (triées par date décroissante) : seules les semaines absentes du cache,
+        nouvelles ou modifiées, sont rendues
+    """
+    weeks = [
+        (week, list(week_activities))
+        for week, week_activities in groupby(activities, key=iso_week)
+    ]
+    keys = [week_key(user.pk, week, week_activities) for week, week_activities in weeks]
+    cached = cache.get_many(keys)
+
+    fragments, rendered = [], {}
+    for key, (week, week_activities) in zip(keys, weeks):
+        fragment = cached.get(key)
+        if fragment is None:
+            fragment = render_to_string(
+                WEEK_TEMPLATE, {"week": week[1], "activity_list": week_activities}
+            )
+            rendered[key] = fragment
+        fragments.append(mark_safe(fragment))
+
+    if rendered:
+        cache.set_many(rendered, TIMEOUT)
+        cache_stats.count(KEY_PREFIX, "misses", len(rendered))
+    if len(weeks) > len(rendered):
+        cache_stats.count(KEY_PREFIX, "hits", len(weeks) - len(rendered))
+    return fragments
@@ -0,0 +1,107 @@
+from datetime import timedelta
+from django.apps import apps
+from django.utils import timezone
+from simple_history.utils import get_history_model_for_model
+
+# nombre d'objets historiques supprimés par requête
+DELETE_CHUNK_SIZE = 500
+
+
+def history_models():
+    """
+        modèles de l'application dont les modifications sont historisées
+    """
+    return [
+        model
+        for model in apps.get_app_config("projects").get_models()
+        if hasattr(model._meta, "simple_history_manager_attribute")
+    ]
+
+
+def tracked_fields(model):
+    """
+        champs comparés pour reconnaître un enregistrement sans modification :
+        ceux de l'objet hormis les dates de mise à jour automatiques
+    """
+    return [
+        field.attname
+        for field in model._meta.fields
+        if not getattr(field, "auto_now", False)
+    ]
+
+
+def versions_by_object(model):
+    """
+        versions de chaque objet, de la plus récente à la plus ancienne, lues en
+        une seule requête parcourue au fil de l'eau :
+        [(history_id, history_date, history_type, valeurs)]
+    """
+    history_model = get_history_model_for_model(model)
+    pk_name = model._meta.pk.attname
+    fields = tracked_fields(model)
+    rows = (
+        history_model.objects.order_by(pk_name, "-history_date", "-history_id")
+        .values_list("history_id", "history_date", "history_type", *fields)
+        .iterator()
+    )
+
+    pk_index = 3 + fields.index(pk_name)
+    current, versions = None, []
+    for row in rows:
+        if versions and row[pk_index] != current:
+            yield versions
+            versions = []
+        current = row[pk_index]
+        versions.append((row[0], row[1], row[2], row[3:]))
+    if versions:
+        yield versions
+
+
+def expired(versions, keep=None, before=None, collapse=True):
+    """
+        history_id des versions d'un objet (de la plus récente à la plus ancienne)
+        à supprimer : modifications sans effet si collapse, puis au-delà des keep
+        plus récentes celles antérieures à before (toutes si before est None)
+    """
+    kept, removed = [], []
+    for i, version in enumerate(versions):
+        history_id, history_date, history_type, values = version
+        older = versions[i + 1] if i + 1 < len(versions) else None
+        if (
+            collapse
+            and history_type == "~"
+            and older is not None
+            and older[3] == values
+        ):
+            removed.append(history_id)
+        else:
+            kept.append(version)
+
+    if keep is not None:
+        for history_id, history_date, history_type, values in kept[keep:]:
+            if before is None or history_date < before:
+                removed.append(history_id)
+    return removed
+
+
+def prune(model, keep=None, days=None, collapse=True, dry_run=False):
+    """
+        applique la politique de conservation à l'historique d'un modèle et
+        renvoie le nombre de versions supprimées (ou à supprimer si dry_run) ; la
+        version la plus récente de chaque objet est toujours conservée
+    """
+    if keep is not None:
+        keep = max(keep, 1)
+    before = None if days is None else timezone.now() - timedelta(days=days)
+    history_model = get_history_model_for_model(model)
+
+    removed = []
+    for versions in versions_by_object(model):
+        removed.extend(expired(versions, keep, before, collapse))
+
+    if not dry_run:
+        for i in range(0, len(removed), DELETE_CHUNK_SIZE):
+            history_model.objects.filter(
+                history_id__in=removed[i : i + DELETE_CHUNK_SIZE]
+            ).delete()
+    return len(removed)
@@ -0,0 +1,157 @@
+import csv
+import math
+import re
+import time
+from datetime import timedelta
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils.dateparse import parse_date
+from simple_history.utils import bulk_create_with_history
+from accounts.models import CustomUser
+from projects.models import Activity, Capacity, Leave, Location, Project
+from projects.signals import after_bulk_create
+
+DURATION_RE = re.compile(r"^(?P<hours>\d+)\s*[h:]\s*(?P<minutes>\d{0,2})$")
+ONE_HOUR = timedelta(hours=1)
+# une activité, une absence ou une capacité porte sur une journée
+MAX_DURATION = timedelta(hours=24)
+
+
+def parse_hours(value):
+    """
+        durée en heures : « 7h30 », « 7:30 », « 7.5 » ou « 7,5 », d'au plus une
+        journée ; ValueError pour une durée négative ou hors limites
+    """
+    value = value.strip().lower()
+    match = DURATION_RE.match(value)
+    if match:
+        duration = timedelta(
+            hours=int(match.group("hours")), minutes=int(match.group("minutes") or 0)
+        )
+    else:
+        hours = float(value.replace(",", "."))
+        # float() accepte « inf », « nan » ou « 1e20 », hors limites de timedelta
+        if not math.isfinite(hours) or abs(hours) > MAX_DURATION / ONE_HOUR:
+            raise ValueError(value)
+        duration = timedelta(hours=hours)
+    if not timedelta() <= duration <= MAX_DURATION:
+        raise ValueError(value)
+    return duration
+
+
+def parse_bool(value):
+    return value.strip().lower() in ("1", "true", "vrai", "oui", "x")
+
+
+def lookup_map(queryset, label):
+    """
+        {id ou libellé: id} ; les libellés en double ne sont pas retenus
+    """
+    mapping = {}
+    duplicates = set()
+    for pk, text in queryset.values_list("pk", label):
+        mapping[str(pk)] = pk
+        if text in mapping:
+            duplicates.add(text)
+        mapping[text] = pk
+    for text in duplicates:
+        del mapping[text]
+    return mapping
+
+
+class TimesheetImporter:
+    """
+        import en masse d'objets « Activity », « Leave » ou « Capacity » depuis un
+        fichier CSV, lu et enregistré par paquets ; les lignes invalides sont
+        écartées sans interrompre l'import
+
+        Colonnes : user (identifiant), date (AAAA-MM-JJ), duration, comment, et
+        - activity : project (id ou titre), location (id ou titre), progression,
+          is_teleworking, is_business_trip
+        - leave : type (C, R, F, M, S ou A)
+    """
+
+    MODELS = {"activity": Activity, "leave": Leave, "capacity": Capacity}
+
+    def __init__(self, kind, chunk_size=1000, history_user=None):
+        self.model = self.MODELS[kind]
+        self.chunk_size = chunk_size
+        self.history_user = history_user
+
+        self.users = dict(CustomUser.objects.values_list("username", "pk"))
+        if self.model is Activity:
+            self.projects = lookup_map(Project.objects.all(), "title")
+            self.locations = lookup_map(Location.objects.all(), "title")
+
+        self.created = 0
+        self.errors = []
+        self.elapsed = 0
+
+    @property
+    def rate(self):
+        return self.created / self.elapsed if self.elapsed else 0
+
+    def lookup(self, mapping, row, column):
+        value = (row.get(column) or "").strip()
+        try:
+            return mapping[value]
+        except KeyError:
+            raise ValidationError("{} inconnu ou ambigu : « {} »".format(column, value))
+
+    def parse(self, parser, row, column):
+        try:
+            value = parser((row.get(column) or "").strip())
+        except (ValueError, OverflowError):
+            value = None
+        if value is None:
+            raise ValidationError(
+                "{} invalide : « {} »".format(column, row.get(column))
+            )
+        return value
+
+    def build(self, row):
+        obj = self.model(user_id=self.lookup(self.users, row, "user"))
+        obj.date = self.parse(parse_date, row, "date")
+        if row.get("duration"):
+            obj.duration = self.parse(parse_hours, row, "duration")
+        obj.comment = row.get("comment") or None
+
+        if self.model is Activity:
+            obj.project_id = self.lookup(self.projects, row, "project")
+            obj.location_id = self.lookup(self.locations, row, "location")
+            if row.get("progression"):
+                obj.progression = self.parse(int, row, "progression")
+            obj.is_teleworking = parse_bool(row.get("is_teleworking") or "")
+            obj.is_business_trip = parse_bool(row.get("is_business_trip") or "")
+        elif self.model is Leave and row.get("type"):
+            obj.type = row["type"].strip().upper()
+
+        # les clés étrangères sont déjà résolues : pas de requête de validation
+        obj.clean_fields(exclude=["user", "project", "location"])
+        obj._history_user = self.history_user
+        return obj
+
+    def save(self, chunk):
+        with transaction.atomic():
+            bulk_create_with_history(chunk, self.model)
+            after_bulk_create(self.model, chunk)
+        self.created += len(chunk)
+
+    def run(self, lines, delimiter=","):
+        """
+            importe les lignes CSV (itérable de chaînes, en-tête compris)
+        """
+        start = time.perf_counter()
+        reader = csv.DictReader(lines, delimiter=delimiter)
+        chunk = []
+        for row in reader:
+            try:
+                chunk.append(self.build(row))
+            except ValidationError as e:
+                self.errors.append((reader.line_num, "; ".join(e.messages)))
+            if len(chunk) >= self.chunk_size:
+                self.save(chunk)
+                chunk = []
+        if chunk:
+            self.save(chunk)
+        self.elapsed = time.perf_counter() - start
@@ -0,0 +1,15 @@
+from django.utils.dateparse import parse_date
+
+
+def positive(value):
+    value = int(value)
+    if value < 1:
+        raise ValueError(value)
+    return value
+
+
+def date_argument(value):
+    date = parse_date(value)
+    if date is None:
+        raise ValueError(value)
+    return date
@@ -0,0 +1,106 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import (
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+from django.utils import timezone
+from projects import benchmark
+from projects.management.arguments import positive
+from projects.synthetic import Organisation
+
+
+class Command(BaseCommand):
+    help = (
+        "Construit une organisation synthétique dans une base de test et mesure "
+        "les vues et les propriétés coûteuses des projets."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=positive, default=20)
+        parser.add_argument("--depth", type=positive, default=3)
+        parser.add_argument("--fanout", type=positive, default=4)
+        parser.add_argument(
+            "--activities",
+            type=int,
+            default=400,
+            help="activités par utilisateur et par an",
+        )
+        parser.add_argument("--years", type=positive, default=1)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--repeat", type=positive, default=5)
+        parser.add_argument("--output", help="fichier JSON des résultats")
+        parser.add_argument("--compare", help="fichier JSON d'un passage précédent")
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=0.1,
+            help="écart relatif en deçà duquel la comparaison est tue",
+        )
+
+    def handle(self, *args, **options):
+        previous = None
+        if options["compare"]:
+            try:
+                with open(options["compare"], encoding="utf-8") as f:
+                    previous = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(e)
+
+        parameters = {
+            key: options[key]
+            for key in ("users", "depth", "fanout", "activities", "years", "seed")
+        }
+        until = timezone.now().today().date()
+
+        # base et cache de test : le passage ne touche pas aux données ni au
+        # cache de l'application
+        setup_test_environment()
+        old_config = setup_databases(options["verbosity"] - 1, interactive=False)
+        try:
+            with benchmark.private_cache():
+                organisation = Organisation(until, **parameters)
+                created = organisation.build()
+                results = benchmark.run(organisation, repeat=options["repeat"])
+        finally:
+            teardown_databases(old_config, options["verbosity"] - 1)
+            teardown_test_environment()
+
+        report = {
+            "date": until,
+            "parameters": parameters,
+            "created": created,
+            "environment": benchmark.environment(),
+            "results": results,
+        }
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2, sort_keys=True, default=str)
+
+        for name, result in sorted(results.items()):
+            self.stdout.write(
+                "{:45} {:5} requête(s) {:9.1f} ms {:9.0f} Ko".format(
+                    name,
+                    result["queries"],
+                    1000 * result["time_median"],
+                    result["peak_memory"] / 1024,
+                )
+            )
+
+        if previous is not None:
+            self.stdout.write("")
+            for name, key, before, after, ratio in benchmark.compare(
+                previous["results"], results
+            ):
+                if ratio is None or abs(ratio - 1) < options["threshold"]:
+                    continue
+                style = self.style.ERROR if ratio > 1 else self.style.SUCCESS
+                self.stdout.write(
+                    style(
+                        "{:45} {:12} {:>12.4g} → {:<12.4g} (x{:.2f})".format(
+                            name, key, before, after, ratio
+                        )
+                    )
+                )
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from projects import stats
+
+
+class Command(BaseCommand):
+    help = "Compare la table ProjectStats au calcul direct des indicateurs."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--repair",
+            action="store_true",
+            help="recalcule entièrement la table au lieu de la vérifier",
+        )
+
+    def handle(self, *args, **options):
+        if options["repair"]:
+            stats.rebuild()
+            self.stdout.write(self.style.SUCCESS("Statistiques recalculées."))
+            return
+
+        errors = stats.differences()
+        for project, field, stored, expected in errors:
+            self.stdout.write(
+                "{} ({}) : {} enregistré, {} attendu".format(
+                    project.title, field, stored, expected
+                )
+            )
+        if errors:
+            raise CommandError("{} écart(s) constaté(s)".format(len(errors)))
+        self.stdout.write(self.style.SUCCESS("Statistiques correctes."))
@@ -0,0 +1,107 @@
+from collections import Counter
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from simple_history.utils import bulk_create_with_history
+from accounts.models import CustomUser
+from projects.models import Capacity, CapacityPattern
+from projects.planning import date_range
+from projects.signals import after_bulk_create
+
+
+class Command(BaseCommand):
+    help = (
+        "Remplace les objets « Capacity » journaliers de chaque utilisateur sans "
+        "capacité hebdomadaire par une capacité hebdomadaire et les seules "
+        "exceptions à celle-ci."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "usernames", nargs="*", help="utilisateurs concernés (tous par défaut)"
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="affiche le résultat sans modifier la base",
+        )
+
+    def handle(self, *args, **options):
+        users = CustomUser.objects.exclude(
+            pk__in=CapacityPattern.objects.values("user")
+        ).filter(pk__in=Capacity.objects.values("user"))
+        if options["usernames"]:
+            users = users.filter(username__in=options["usernames"])
+
+        for user in users.order_by("username"):
+            with transaction.atomic():
+                pattern, deleted, created = self.compact(user, options["dry_run"])
+            self.stdout.write(
+                "{} : {} du {} au {}, {} capacité(s) supprimée(s), {} exception(s) "
+                "ajoutée(s)".format(
+                    user,
+                    " ".join(
+                        "{:g}".format(duration / timedelta(hours=1))
+                        for duration in pattern.weekly()
+                    ),
+                    pattern.valid_from,
+                    pattern.valid_to,
+                    deleted,
+                    created,
+                )
+            )
+
+    def compact(self, user, dry_run):
+        """
+            capacité hebdomadaire la plus fréquente jour par jour de la semaine sur
+            la période couverte par les objets « Capacity » de l'utilisateur (un
+            jour sans objet valant 0) ; les objets conformes à cette capacité, seuls
+            dans leur journée et sans commentaire, sont supprimés, les jours sans
+            objet reçoivent une exception nulle
+        """
+        by_date = {}
+        for capacity in Capacity.objects.filter(user=user).order_by("date"):
+            by_date.setdefault(capacity.date, []).append(capacity)
+        dates = date_range(min(by_date), max(by_date))
+
+        totals = {
+            date: sum(
+                (capacity.duration for capacity in by_date.get(date, [])), timedelta()
+            )
+            for date in dates
+        }
+        counters = [Counter() for weekday in CapacityPattern.WEEKDAYS]
+        for date in dates:
+            counters[date.weekday()][totals[date]] += 1
+        pattern = CapacityPattern(
+            user=user,
+            valid_from=dates[0],
+            valid_to=dates[-1],
+            comment="capacités journalières regroupées",
+            **{
+                weekday: counter.most_common(1)[0][0] if counter else timedelta()
+                for weekday, counter in zip(CapacityPattern.WEEKDAYS, counters)
+            }
+        )
+
+        weekly = pattern.weekly()
+        redundant = [
+            capacities[0].pk
+            for date, capacities in by_date.items()
+            if len(capacities) == 1
+            and not capacities[0].comment
+            and capacities[0].duration == weekly[date.weekday()]
+        ]
+        exceptions = [
+            Capacity(user=user, date=date, duration=timedelta())
+            for date in dates
+            if date not in by_date and weekly[date.weekday()]
+        ]
+
+        if not dry_run:
+            pattern.save()
+            Capacity.objects.filter(pk__in=redundant).delete()
+            if exceptions:
+                bulk_create_with_history(exceptions, Capacity)
+                after_bulk_create(Capacity, exceptions)
+        return pattern, len(redundant), len(exceptions)
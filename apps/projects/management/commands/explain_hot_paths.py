@@ -0,0 +1,72 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.utils import timezone
+from accounts.models import CustomUser
+from projects import query_plans
+from projects.models import Activity
+
+
+class Command(BaseCommand):
+    help = (
+        "Affiche le plan d'exécution des requêtes des vues les plus sollicitées "
+        "et signale les parcours complets de table."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--username",
+            help="utilisateur des requêtes (par défaut celui qui a le plus d'activités)",
+        )
+        parser.add_argument(
+            "--strict",
+            action="store_true",
+            help="échoue si un parcours complet de table est trouvé",
+        )
+
+    def handle(self, *args, **options):
+        activities = Activity.objects.order_by()
+        if options["username"]:
+            try:
+                user = CustomUser.objects.get(username=options["username"])
+            except CustomUser.DoesNotExist:
+                raise CommandError("Utilisateur inconnu.")
+            activities = activities.filter(user=user)
+        activity = (
+            activities.filter(
+                user__in=activities.values("user")
+                .annotate(count=Count("pk"))
+                .order_by("-count")
+                .values("user")[:1]
+            )
+            .select_related("user", "project")
+            .first()
+        )
+        if activity is None:
+            raise CommandError(
+                "Aucune activité à partir de laquelle bâtir les requêtes."
+            )
+
+        scans = 0
+        for name, queryset in query_plans.hot_paths(
+            activity.user, activity.project, timezone.now().today().date()
+        ):
+            plan = queryset.explain()
+            found = query_plans.full_scans(plan)
+            scans += len(found)
+            if found:
+                self.stdout.write(self.style.ERROR(name + " : parcours complet"))
+            elif query_plans.sorts(plan):
+                self.stdout.write(self.style.WARNING(name + " : index, tri sans index"))
+            else:
+                self.stdout.write(self.style.SUCCESS(name + " : index"))
+            if options["verbosity"] > 1 or found:
+                for line in plan.splitlines():
+                    self.stdout.write("    " + line)
+
+        message = "{} parcours complet(s) de table ({}).".format(
+            scans, connection.vendor
+        )
+        if scans and options["strict"]:
+            raise CommandError(message)
+        self.stdout.write(message)
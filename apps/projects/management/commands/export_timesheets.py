@@ -0,0 +1,47 @@
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from accounts.models import CustomUser
+from projects.exports import CHUNK_SIZE, EXPORTS, csv_lines, export_queryset
+from projects.management.arguments import date_argument
+from projects.models import Project
+
+
+class Command(BaseCommand):
+    help = "Exporte en CSV, au fil de la lecture, des activités, absences ou capacités."
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=sorted(EXPORTS))
+        parser.add_argument("--user", help="identifiant de l'utilisateur")
+        parser.add_argument("--project", help="id du projet (sous-projets inclus)")
+        parser.add_argument("--start", type=date_argument, help="AAAA-MM-JJ, inclus")
+        parser.add_argument("--end", type=date_argument, help="AAAA-MM-JJ, inclus")
+        parser.add_argument(
+            "--output", help="fichier de sortie (sortie standard par défaut)"
+        )
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+        parser.add_argument("--delimiter", default=",")
+
+    def handle(self, *args, **options):
+        user = project = None
+        try:
+            if options["user"]:
+                user = CustomUser.objects.get(username=options["user"])
+            if options["project"]:
+                project = Project.objects.get(id=options["project"])
+        except (CustomUser.DoesNotExist, Project.DoesNotExist) as e:
+            raise CommandError(e)
+
+        queryset = export_queryset(
+            options["kind"], user, project, options["start"], options["end"]
+        )
+        lines = csv_lines(
+            options["kind"],
+            queryset,
+            chunk_size=options["chunk_size"],
+            delimiter=options["delimiter"],
+        )
+        if options["output"]:
+            with open(options["output"], "w", newline="", encoding="utf-8") as f:
+                f.writelines(lines)
+        else:
+            sys.stdout.writelines(lines)
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from projects.management.arguments import positive
+from projects.synthetic import Organisation
+
+
+class Command(BaseCommand):
+    help = "Ajoute une organisation synthétique à la base, pour les essais."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=positive, default=20)
+        parser.add_argument("--depth", type=positive, default=3)
+        parser.add_argument("--fanout", type=positive, default=4)
+        parser.add_argument(
+            "--activities",
+            type=int,
+            default=400,
+            help="activités par utilisateur et par an",
+        )
+        parser.add_argument("--years", type=positive, default=1)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--prefix", default="bench", help="préfixe des utilisateurs et projets"
+        )
+
+    def handle(self, *args, **options):
+        organisation = Organisation(
+            timezone.now().today().date(),
+            **{
+                key: options[key]
+                for key in (
+                    "users",
+                    "depth",
+                    "fanout",
+                    "activities",
+                    "years",
+                    "seed",
+                    "prefix",
+                )
+            }
+        )
+        created = organisation.build()
+        for model, count in sorted(created.items()):
+            self.stdout.write("{} : {}".format(model, count))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from projects.importers import TimesheetImporter
+
+
+class Command(BaseCommand):
+    help = (
+        "Importe en masse des activités, absences ou capacités depuis un fichier CSV."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=sorted(TimesheetImporter.MODELS))
+        parser.add_argument("path", help="fichier CSV avec une ligne d'en-tête")
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument("--delimiter", default=",")
+        parser.add_argument("--encoding", default="utf-8-sig")
+
+    def handle(self, *args, **options):
+        importer = TimesheetImporter(options["kind"], chunk_size=options["chunk_size"])
+        try:
+            with open(options["path"], newline="", encoding=options["encoding"]) as f:
+                importer.run(f, delimiter=options["delimiter"])
+        except OSError as e:
+            raise CommandError(e)
+
+        for line, message in importer.errors:
+            self.stderr.write("ligne {} : {}".format(line, message))
+        self.stdout.write(
+            self.style.SUCCESS(
+                "{} ligne(s) importée(s) en {:.1f} s ({:.0f} lignes/s), "
+                "{} ligne(s) rejetée(s).".format(
+                    importer.created,
+                    importer.elapsed,
+                    importer.rate,
+                    len(importer.errors),
+                )
+            )
+        )
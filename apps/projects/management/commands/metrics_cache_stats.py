@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from projects import cache_stats, fragments, metrics_cache
+
+
+class Command(BaseCommand):
+    help = (
+        "Affiche l'efficacité du cache des indicateurs de projets et de celui des "
+        "semaines du relevé d'heures."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset", action="store_true", help="remet les compteurs à zéro"
+        )
+
+    def handle(self, *args, **options):
+        for label, module in (
+            ("indicateurs de projets", metrics_cache),
+            ("semaines du relevé d'heures", fragments),
+        ):
+            stats = cache_stats.get_stats(module.KEY_PREFIX)
+            total = stats["hits"] + stats["misses"]
+            ratio = 100 * stats["hits"] / total if total else 0
+            self.stdout.write(
+                "{} : ".format(label)
+                + "{hits} hit(s), {misses} miss(es)".format(**stats)
+                + " ({:.1f} % de hits)".format(ratio)
+            )
+            if options["reset"]:
+                cache_stats.reset_stats(module.KEY_PREFIX)
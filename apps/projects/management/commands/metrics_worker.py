@@ -0,0 +1,154 @@
+import signal
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+from accounts.models import CustomUser
+from projects import metrics_cache, snapshots, stats
+from projects.management.arguments import positive
+from projects.models import (
+    Activity,
+    Capacity,
+    CapacityPattern,
+    Leave,
+    Project,
+    Resource,
+)
+
+
+def close_connections():
+    # chaque processus ouvre ses propres connexions, jamais celles héritées
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        "Précalcule les tableaux de bord des utilisateurs et les indicateurs des "
+        "projets dès que les données changent, pour que les vues n'aient qu'à les "
+        "lire."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=positive,
+            default=1,
+            help="processus de calcul des tableaux de bord",
+        )
+        parser.add_argument(
+            "--interval",
+            type=positive,
+            default=30,
+            help="secondes entre deux recherches de modifications",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="recalcule tout une fois puis s'arrête (passage nocturne)",
+        )
+
+    def handle(self, *args, **options):
+        self.verbosity = options["verbosity"]
+        self.workers = options["workers"]
+        if not metrics_cache.is_shared():
+            self.stderr.write(
+                "Cache propre à chaque processus : les indicateurs des projets ne "
+                "sont pas précalculés."
+            )
+        elif not metrics_cache.fits(Project.objects.count()):
+            self.stderr.write(
+                "Cache trop petit pour l'arbre des projets : augmentez "
+                "CACHES['default']['OPTIONS']['MAX_ENTRIES']."
+            )
+
+        if options["once"]:
+            stats.rebuild()
+            self.refresh(force=True)
+            return
+
+        stop = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda signum, frame: stop.set())
+
+        watermark = None
+        while not stop.is_set():
+            current = self.watermark()
+            # après une erreur, les mêmes données sont reprises au tour suivant
+            if current != watermark and not self.refresh():
+                watermark = current
+            stop.wait(options["interval"])
+
+    def watermark(self):
+        """
+            empreinte des données dont dépendent les tableaux de bord et les
+            indicateurs : dernières mises à jour (updated_at) et nombres de lignes
+        """
+        return (
+            timezone.now().today().date(),
+            snapshots.data_version(
+                Activity.objects.all(),
+                Resource.objects.all(),
+                Leave.objects.all(),
+                Capacity.objects.all(),
+                CapacityPattern.objects.all(),
+                Project.objects.all(),
+                CustomUser.objects.all(),
+            ),
+        )
+
+    def refresh(self, force=False):
+        start = time.perf_counter()
+        subtrees = metrics_cache.warm()
+
+        start_date = timezone.now().today().date()
+        users = list(CustomUser.objects.filter(is_active=True))
+        user_ids = [user.pk for user in users]
+        refreshed = errors = 0
+        if self.workers == 1:
+            results = [
+                self.run(snapshots.refresh_dashboard, user_id, start_date, force)
+                for user_id in user_ids
+            ]
+        else:
+            snapshots.prepare(users, start_date)
+            close_connections()
+            with ProcessPoolExecutor(
+                max_workers=self.workers, initializer=close_connections
+            ) as pool:
+                futures = [
+                    pool.submit(snapshots.refresh_dashboard, user_id, start_date, force)
+                    for user_id in user_ids
+                ]
+                results = [self.run(future.result) for future in as_completed(futures)]
+        for result in results:
+            if result is False:
+                errors += 1
+            elif result is not None:
+                snapshots.save_snapshot(result)
+                refreshed += 1
+
+        if self.verbosity:
+            self.stdout.write(
+                "{} {} sous-arbre(s), {} tableau(x) de bord recalculé(s), "
+                "{} erreur(s) en {:.1f} s".format(
+                    timezone.now().strftime("%Y-%m-%d %H:%M:%S"),
+                    subtrees,
+                    refreshed,
+                    errors,
+                    time.perf_counter() - start,
+                )
+            )
+        return errors
+
+    def run(self, func, *args):
+        """
+            résultat de func(*args), False en cas d'erreur : l'erreur d'un
+            utilisateur n'interrompt pas les autres
+        """
+        try:
+            return func(*args)
+        except Exception as e:
+            self.stderr.write("Erreur : {!r}".format(e))
+            return False
@@ -0,0 +1,67 @@
+import json
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from accounts.models import CustomUser
+from projects.management.arguments import date_argument
+from projects.models import Project
+from projects.reports import PERIODS, PivotReport
+
+
+class Command(BaseCommand):
+    help = (
+        "Rapport du temps passé par utilisateur, projet (cumulé à un niveau de "
+        "l'arbre) et période, en CSV ou JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--start", type=date_argument, help="AAAA-MM-JJ, inclus (début d'année)"
+        )
+        parser.add_argument(
+            "--end", type=date_argument, help="AAAA-MM-JJ, inclus (aujourd'hui)"
+        )
+        parser.add_argument("--period", choices=sorted(PERIODS), default="month")
+        parser.add_argument(
+            "--level", type=int, default=0, help="niveau de l'arbre des projets"
+        )
+        parser.add_argument(
+            "--user", action="append", help="identifiant d'utilisateur (répétable)"
+        )
+        parser.add_argument("--project", help="id du projet (sous-projets inclus)")
+        parser.add_argument("--format", choices=("csv", "json"), default="csv")
+        parser.add_argument(
+            "--output", help="fichier de sortie (sortie standard par défaut)"
+        )
+        parser.add_argument("--delimiter", default=",")
+
+    def handle(self, *args, **options):
+        end_date = options["end"] or timezone.now().today().date()
+        start_date = options["start"] or end_date.replace(month=1, day=1)
+        if start_date > end_date or options["level"] < 0:
+            raise CommandError("Période ou niveau invalide.")
+
+        users = root = None
+        try:
+            if options["user"]:
+                users = [
+                    CustomUser.objects.get(username=username)
+                    for username in options["user"]
+                ]
+            if options["project"]:
+                root = Project.objects.get(id=options["project"])
+        except (CustomUser.DoesNotExist, Project.DoesNotExist) as e:
+            raise CommandError(e)
+
+        report = PivotReport(
+            start_date, end_date, options["period"], options["level"], users, root
+        ).run()
+        if options["format"] == "json":
+            lines = [json.dumps(report.as_json(), indent=2), "\n"]
+        else:
+            lines = report.csv_lines(delimiter=options["delimiter"])
+        if options["output"]:
+            with open(options["output"], "w", newline="", encoding="utf-8") as f:
+                f.writelines(lines)
+        else:
+            sys.stdout.writelines(lines)
@@ -0,0 +1,72 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from projects import history
+
+
+class Command(BaseCommand):
+    help = (
+        "Supprime les versions historiques sans modification puis les plus "
+        "anciennes au-delà des dernières versions de chaque objet."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "models",
+            nargs="*",
+            help="modèles concernés (tous les historisés par défaut)",
+        )
+        parser.add_argument(
+            "--keep",
+            type=int,
+            default=getattr(settings, "HISTORY_RETENTION_KEEP", None),
+            help="versions conservées par objet",
+        )
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=getattr(settings, "HISTORY_RETENTION_DAYS", None),
+            help="âge en jours au-delà duquel les versions en trop sont supprimées",
+        )
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="supprime les versions en trop quel que soit leur âge",
+        )
+        parser.add_argument(
+            "--no-collapse",
+            action="store_true",
+            help="conserve les enregistrements sans modification",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="compte les versions à supprimer sans modifier la base",
+        )
+
+    def handle(self, *args, **options):
+        models = {model._meta.model_name: model for model in history.history_models()}
+        names = [name.lower() for name in options["models"]] or sorted(models)
+        unknown = [name for name in names if name not in models]
+        if unknown:
+            raise CommandError(
+                "Modèle(s) sans historique : {}".format(", ".join(unknown))
+            )
+
+        total = 0
+        for name in names:
+            with transaction.atomic():
+                count = history.prune(
+                    models[name],
+                    keep=options["keep"],
+                    days=None if options["all"] else options["days"],
+                    collapse=not options["no_collapse"],
+                    dry_run=options["dry_run"],
+                )
+            total += count
+            self.stdout.write("{} : {} version(s)".format(name, count))
+
+        message = "{} version(s) {}.".format(
+            total, "à supprimer" if options["dry_run"] else "supprimée(s)"
+        )
+        self.stdout.write(self.style.SUCCESS(message))
@@ -0,0 +1,63 @@
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from accounts.models import CustomUser
+from projects import balance
+from projects.models import BalanceCheckpoint
+
+
+class Command(BaseCommand):
+    help = "Recalcule depuis le début les points de solde d'heures, ou les vérifie."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "usernames", nargs="*", help="utilisateurs concernés (tous par défaut)"
+        )
+        parser.add_argument(
+            "--verify",
+            action="store_true",
+            help="compare les points de solde enregistrés au recalcul sans les modifier",
+        )
+
+    def handle(self, *args, **options):
+        users = CustomUser.objects.all()
+        if options["usernames"]:
+            users = users.filter(username__in=options["usernames"])
+        users = list(users)
+
+        today = date.today()
+        expected = balance.compute_checkpoints(users, today)
+        checkpoints = BalanceCheckpoint.objects.filter(user__in=users)
+
+        if options["verify"]:
+            errors = 0
+            for checkpoint in checkpoints.filter(month__lte=today).select_related(
+                "user"
+            ):
+                # avant le premier mois renseigné, le solde est nul
+                value = expected.get(
+                    (checkpoint.user_id, checkpoint.month), timedelta()
+                )
+                if value != checkpoint.balance:
+                    errors += 1
+                    self.stdout.write(
+                        "{} au {} : {} enregistré, {} attendu".format(
+                            checkpoint.user, checkpoint.month, checkpoint.balance, value
+                        )
+                    )
+            if errors:
+                raise CommandError("{} point(s) de solde incorrect(s)".format(errors))
+            self.stdout.write(self.style.SUCCESS("Points de solde corrects."))
+            return
+
+        with transaction.atomic():
+            checkpoints.delete()
+            BalanceCheckpoint.objects.bulk_create(
+                BalanceCheckpoint(user_id=user_id, month=month, balance=value)
+                for (user_id, month), value in expected.items()
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                "{} point(s) de solde recalculé(s).".format(len(expected))
+            )
+        )
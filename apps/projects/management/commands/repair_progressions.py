@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from projects.models import Project
+
+
+class Command(BaseCommand):
+    help = "Recalcule la dernière progression enregistrée sur chaque projet."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="signale les projets à corriger sans les modifier",
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            changed = Project.objects.all().refresh_progression()
+            if options["check"]:
+                transaction.set_rollback(True)
+
+        if options["check"]:
+            if changed:
+                raise CommandError("{} projet(s) à corriger".format(changed))
+            self.stdout.write(self.style.SUCCESS("Progressions à jour."))
+            return
+        self.stdout.write(
+            self.style.SUCCESS("{} projet(s) corrigé(s).".format(changed))
+        )
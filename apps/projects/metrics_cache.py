@@ -0,0 +1,194 @@
+from functools import reduce
+from operator import or_
+from uuid import uuid4
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.memcached import BaseMemcachedCache
+from django.db.models import Q
+from projects import cache_stats
+from projects.models import Project
+from projects.rollup import rollup_projects
+
+KEY_PREFIX = "projects:metrics"
+TIMEOUT = 60 * 60 * 24
+
+# la version d'un projet change à chaque modification d'une activité ou d'une
+# ressource de son sous-arbre ; celle de l'arbre à chaque modification d'un projet
+TREE_VERSION_KEY = "{}:tree".format(KEY_PREFIX)
+
+
+def is_shared():
+    """
+        le cache est-il commun à tous les processus ? Les versions changées par le
+        processus qui traite une modification doivent être vues des autres, sans
+        quoi ils serviraient des indicateurs périmés : avec un cache propre à
+        chaque processus, les indicateurs ne sont pas mis en cache
+    """
+    return not isinstance(caches["default"], (LocMemCache, DummyCache))
+
+
+def fits(projects):
+    """
+        le cache peut-il contenir la version et les indicateurs de projects
+        projets sans évincer d'entrées ? Au-delà de MAX_ENTRIES, les caches
+        fichier et base de données évincent des entrées au hasard, versions
+        comprises, et warm() recalcule alors tout l'arbre à chaque passage ;
+        memcached évince selon la mémoire, pas le nombre d'entrées
+    """
+    backend = caches["default"]
+    return isinstance(backend, BaseMemcachedCache) or 2 * projects < getattr(
+        backend, "_max_entries", 0
+    )
+
+
+def version_key(project_id):
+    return "{}:version:{}".format(KEY_PREFIX, project_id)
+
+
+def new_version():
+    return uuid4().hex
+
+
+def get_versions(keys):
+    """
+        versions courantes ; une version absente (jamais créée ou évincée du cache)
+        est remplacée par une nouvelle, qui ne peut correspondre à aucune entrée
+    """
+    versions = cache.get_many(keys)
+    missing = {key: new_version() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return versions
+
+
+def invalidate(project_ids):
+    """
+        change la version des projets et de tous leurs ancêtres
+    """
+    projects = Project.objects.filter(pk__in=project_ids)
+    ancestors = Project.objects.get_queryset_ancestors(projects, include_self=True)
+    cache.set_many(
+        {
+            version_key(pk): new_version()
+            for pk in ancestors.values_list("pk", flat=True)
+        },
+        None,
+    )
+
+
+def invalidate_tree():
+    """
+        invalide tous les sous-arbres, après un changement dans l'arbre des projets
+    """
+    cache.set(TREE_VERSION_KEY, new_version(), None)
+
+
+def subtrees(roots):
+    return reduce(
+        or_,
+        (
+            Q(tree_id=root.tree_id, lft__gte=root.lft, rght__lte=root.rght)
+            for root in roots
+        ),
+    )
+
+
+def subtree_key(project_id, versions):
+    return "{}:{}:{}:{}".format(
+        KEY_PREFIX,
+        project_id,
+        versions[version_key(project_id)],
+        versions[TREE_VERSION_KEY],
+    )
+
+
+def cached_rollup(roots):
+    """
+        comme rollup_projects(), pour les sous-arbres des projets donnés : les
+        indicateurs de chaque sous-arbre sont conservés dans le cache partagé tant
+        que la version de sa racine et celle de l'arbre n'ont pas changé
+    """
+    roots = list(roots)
+    if not roots:
+        return []
+    if not is_shared():
+        return rollup_projects(Project.objects.filter(subtrees(roots)))
+
+    versions = get_versions(
+        [TREE_VERSION_KEY] + [version_key(root.pk) for root in roots]
+    )
+    keys = {root.pk: subtree_key(root.pk, versions) for root in roots}
+    cached = cache.get_many(keys.values())
+
+    projects = []
+    misses = [root for root in roots if keys[root.pk] not in cached]
+    hits = [root for root in roots if keys[root.pk] in cached]
+    if hits:
+        metrics = {}
+        for root in hits:
+            metrics.update(cached[keys[root.pk]])
+        hit_projects = list(Project.objects.filter(subtrees(hits)))
+        if all(project.pk in metrics for project in hit_projects):
+            for project in hit_projects:
+                project._metrics = metrics[project.pk]
+            projects += hit_projects
+        else:
+            misses, hits = roots, []
+    if hits:
+        cache_stats.count(KEY_PREFIX, "hits", len(hits))
+
+    if misses:
+        cache_stats.count(KEY_PREFIX, "misses", len(misses))
+        computed = rollup_projects(Project.objects.filter(subtrees(misses)))
+        cache.set_many(
+            {
+                keys[root.pk]: {
+                    project.pk: project._metrics
+                    for project in computed
+                    if project.tree_id == root.tree_id
+                    and root.lft <= project.lft <= root.rght
+                }
+                for root in misses
+            },
+            TIMEOUT,
+        )
+        projects += computed
+
+    projects.sort(key=lambda project: (project.tree_id, project.lft))
+    return projects
+
+
+def warm():
+    """
+        met en cache les indicateurs de tous les sous-arbres absents ou périmés, à
+        partir d'un seul calcul de l'arbre entier ; renvoie le nombre de
+        sous-arbres mis en cache (aucun si le cache n'est pas partagé)
+    """
+    if not is_shared():
+        return 0
+    projects = list(Project.objects.order_by("tree_id", "lft"))
+    versions = get_versions(
+        [TREE_VERSION_KEY] + [version_key(project.pk) for project in projects]
+    )
+    keys = {project.pk: subtree_key(project.pk, versions) for project in projects}
+    cached = cache.get_many(keys.values())
+    missing = {pk for pk, key in keys.items() if key not in cached}
+    if not missing:
+        return 0
+
+    computed = rollup_projects()
+    entries = {}
+    for i, root in enumerate(computed):
+        if root.pk not in missing:
+            continue
+        # le sous-arbre d'un projet suit le projet en ordre préfixe
+        subtree = {}
+        for project in computed[i:]:
+            if project.tree_id != root.tree_id or project.lft > root.rght:
+                break
+            subtree[project.pk] = project._metrics
+        entries[keys[root.pk]] = subtree
+    cache.set_many(entries, TIMEOUT)
+    return len(entries)
@@ -0,0 +1,153 @@
+import logging
+import os
+import re
+import time
+import traceback
+from contextlib import ExitStack
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger("projects.sql")
+
+# valeurs littérales et listes de paramètres, retirées pour obtenir la « forme »
+# d'une requête
+LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+IN_LIST_RE = re.compile(r"\bIN \((?:%s|\?)(?:, (?:%s|\?))*\)")
+SPACES_RE = re.compile(r"\s+")
+
+THIS_FILE = os.path.abspath(__file__)
+
+
+def query_shape(sql):
+    sql = LITERAL_RE.sub("?", sql)
+    sql = IN_LIST_RE.sub("IN (...)", sql)
+    return SPACES_RE.sub(" ", sql).strip()
+
+
+def call_sites(limit=3):
+    """
+        derniers appels faits depuis le code du projet (hors bibliothèques), le
+        plus proche de la requête en premier
+    """
+    sites = []
+    for frame in reversed(traceback.extract_stack()):
+        filename = os.path.abspath(frame.filename)
+        if (
+            filename == THIS_FILE
+            or not filename.startswith(settings.BASE_DIR)
+            or "-packages" in filename
+        ):
+            continue
+        sites.append(
+            "{}:{} in {}".format(
+                os.path.relpath(filename, settings.BASE_DIR), frame.lineno, frame.name
+            )
+        )
+        if len(sites) >= limit:
+            break
+    return sites
+
+
+class QueryRecorder:
+    """
+        enveloppe d'exécution (connection.execute_wrapper) relevant le nombre, la
+        durée et la forme des requêtes ; l'origine d'une forme n'est recherchée
+        que lorsqu'elle atteint le seuil de répétition
+    """
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.count = 0
+        self.duration = 0
+        self.shapes = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.count += 1
+            self.duration += duration
+
+            shape = query_shape(sql)
+            record = self.shapes.setdefault(shape, {"count": 0, "duration": 0})
+            record["count"] += 1
+            record["duration"] += duration
+            if record["count"] == self.threshold:
+                record["sites"] = call_sites()
+
+    def repeated(self):
+        """
+            formes de SELECT répétées au moins threshold fois (N+1 probables), les
+            plus fréquentes en premier
+        """
+        return sorted(
+            (
+                dict(record, sql=shape)
+                for shape, record in self.shapes.items()
+                if record["count"] >= self.threshold and shape.startswith("SELECT")
+            ),
+            key=lambda record: -record["count"],
+        )
+
+
+class SQLInstrumentationMiddleware:
+    """
+        relève les requêtes SQL de chaque requête HTTP : en-tête Server-Timing,
+        ligne de journal « projects.sql » et signalement des N+1 probables avec
+        leur origine dans le code
+
+        Activé par SQL_INSTRUMENTATION = True ; le seuil de répétition est
+        SQL_INSTRUMENTATION_THRESHOLD. Les requêtes faites pendant l'envoi d'une
+        réponse en flux ne sont pas comptées.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "SQL_INSTRUMENTATION", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.threshold = getattr(settings, "SQL_INSTRUMENTATION_THRESHOLD", 5)
+
+    def __call__(self, request):
+        recorder = QueryRecorder(self.threshold)
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        total = time.perf_counter() - start
+
+        repeated = recorder.repeated()
+        timing = 'db;dur={:.1f};desc="{} requetes SQL", app;dur={:.1f}'.format(
+            1000 * recorder.duration, recorder.count, 1000 * total
+        )
+        response["Server-Timing"] = timing
+        self.log(request, response, recorder, total, repeated)
+        return response
+
+    def log(self, request, response, recorder, total, repeated):
+        data = {
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "queries": recorder.count,
+            "sql_ms": round(1000 * recorder.duration, 1),
+            "total_ms": round(1000 * total, 1),
+            "repeated": len(repeated),
+        }
+        logger.info(
+            " ".join("{}={}".format(key, value) for key, value in data.items()),
+            extra={"sql": data},
+        )
+        for record in repeated:
+            logger.warning(
+                "N+1 probable sur %s : %s requête(s), %.1f ms, depuis %s : %s",
+                request.path,
+                record["count"],
+                1000 * record["duration"],
+                " < ".join(record.get("sites") or ["?"]),
+                record["sql"],
+                extra={"sql": dict(record, path=request.path)},
+            )
@@ -0,0 +1,35 @@
+# Generated by Django 2.2.5 on 2026-10-18 14:58
+
+import datetime
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('projects', '0002_auto_20190926_0723'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BalanceCheckpoint',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='création')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='mise à jour')),
+                ('month', models.DateField(verbose_name='mois')),
+                ('balance', models.DurationField(default=datetime.timedelta(0), verbose_name='solde')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_checkpoints', related_query_name='balance_checkpoint', to=settings.AUTH_USER_MODEL, verbose_name='utilisateur')),
+            ],
+            options={
+                'verbose_name': 'point de solde',
+                'verbose_name_plural': 'points de solde',
+                'ordering': ('-month',),
+                'unique_together': {('user', 'month')},
+            },
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 2.2.5 on 2026-10-18 15:00
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_last_progression(apps, schema_editor):
+    Activity = apps.get_model("projects", "Activity")
+    Project = apps.get_model("projects", "Project")
+    latest = Activity.objects.filter(
+        project=OuterRef("pk"), progression__isnull=False
+    ).order_by("-date", "-created_at")
+    Project.objects.update(
+        last_progression=Subquery(latest.values("progression")[:1]),
+        last_progression_date=Subquery(latest.values("date")[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0004_activity_user_date_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='historicalproject',
+            name='last_progression',
+            field=models.IntegerField(blank=True, editable=False, null=True, verbose_name='avancement'),
+        ),
+        migrations.AddField(
+            model_name='historicalproject',
+            name='last_progression_date',
+            field=models.DateField(blank=True, editable=False, null=True, verbose_name="date de l'avancement"),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='last_progression',
+            field=models.IntegerField(blank=True, editable=False, null=True, verbose_name='avancement'),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='last_progression_date',
+            field=models.DateField(blank=True, editable=False, null=True, verbose_name="date de l'avancement"),
+        ),
+        migrations.RunPython(backfill_last_progression, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 2.2.5 on 2026-10-18 15:04
+
+import datetime
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0005_project_last_progression'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProjectStats',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='création')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='mise à jour')),
+                ('spent', models.DurationField(default=datetime.timedelta(0), verbose_name='temps passé')),
+                ('allotted', models.DurationField(default=datetime.timedelta(0), verbose_name='temps alloué')),
+                ('remaining_allotted', models.DurationField(default=datetime.timedelta(0), verbose_name='temps alloué restant')),
+                ('remaining_needed', models.DurationField(default=datetime.timedelta(0), verbose_name='temps nécessaire')),
+                ('margin', models.DurationField(default=datetime.timedelta(0), verbose_name='marge')),
+                ('total_spent', models.DurationField(default=datetime.timedelta(0), verbose_name='temps passé cumulé')),
+                ('total_allotted', models.DurationField(default=datetime.timedelta(0), verbose_name='temps alloué cumulé')),
+                ('total_remaining_allotted', models.DurationField(default=datetime.timedelta(0), verbose_name='temps alloué restant cumulé')),
+                ('total_remaining_needed', models.DurationField(default=datetime.timedelta(0), verbose_name='temps nécessaire cumulé')),
+                ('total_margin', models.DurationField(default=datetime.timedelta(0), verbose_name='marge cumulée')),
+                ('project', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to='projects.Project', verbose_name='projet')),
+            ],
+            options={
+                'verbose_name': 'statistiques de projet',
+                'verbose_name_plural': 'statistiques de projets',
+            },
+        ),
+    ]
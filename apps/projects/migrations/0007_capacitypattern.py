@@ -0,0 +1,73 @@
+# Generated by Django 2.2.5 on 2026-10-18 15:31
+
+import datetime
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import simple_history.models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('projects', '0006_projectstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HistoricalCapacityPattern',
+            fields=[
+                ('id', models.UUIDField(db_index=True, default=uuid.uuid4, editable=False)),
+                ('created_at', models.DateTimeField(blank=True, editable=False, verbose_name='création')),
+                ('updated_at', models.DateTimeField(blank=True, editable=False, verbose_name='mise à jour')),
+                ('valid_from', models.DateField(verbose_name='à partir du')),
+                ('valid_to', models.DateField(blank=True, null=True, verbose_name="jusqu'au")),
+                ('monday', models.DurationField(default=datetime.timedelta(seconds=25200), verbose_name='lundi')),
+                ('tuesday', models.DurationField(default=datetime.timedelta(seconds=25200), verbose_name='mardi')),
+                ('wednesday', models.DurationField(default=datetime.timedelta(seconds=25200), verbose_name='mercredi')),
+                ('thursday', models.DurationField(default=datetime.timedelta(seconds=25200), verbose_name='jeudi')),
+                ('friday', models.DurationField(default=datetime.timedelta(seconds=25200), verbose_name='vendredi')),
+                ('saturday', models.DurationField(default=datetime.timedelta(0), verbose_name='samedi')),
+                ('sunday', models.DurationField(default=datetime.timedelta(0), verbose_name='dimanche')),
+                ('comment', models.CharField(blank=True, max_length=1000, null=True, verbose_name='commentaire')),
+                ('history_id', models.AutoField(primary_key=True, serialize=False)),
+                ('history_date', models.DateTimeField()),
+                ('history_change_reason', models.CharField(max_length=100, null=True)),
+                ('history_type', models.CharField(choices=[('+', 'Created'), ('~', 'Changed'), ('-', 'Deleted')], max_length=1)),
+                ('history_user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('user', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', related_query_name='capacity_pattern', to=settings.AUTH_USER_MODEL, verbose_name='utilisateur')),
+            ],
+            options={
+                'verbose_name': 'historical capacité hebdomadaire',
+                'ordering': ('-history_date', '-history_id'),
+                'get_latest_by': 'history_date',
+            },
+            bases=(simple_history.models.HistoricalChanges, models.Model),
+        ),
+        migrations.CreateModel(
+            name='CapacityPattern',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='création')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='mise à jour')),
+                ('valid_from', models.DateField(verbose_name='à partir du')),
+                ('valid_to', models.DateField(blank=True, null=True, verbose_name="jusqu'au")),
+                ('monday', models.DurationField(default=datetime.timedelta(seconds=25200), verbose_name='lundi')),
+                ('tuesday', models.DurationField(default=datetime.timedelta(seconds=25200), verbose_name='mardi')),
+                ('wednesday', models.DurationField(default=datetime.timedelta(seconds=25200), verbose_name='mercredi')),
+                ('thursday', models.DurationField(default=datetime.timedelta(seconds=25200), verbose_name='jeudi')),
+                ('friday', models.DurationField(default=datetime.timedelta(seconds=25200), verbose_name='vendredi')),
+                ('saturday', models.DurationField(default=datetime.timedelta(0), verbose_name='samedi')),
+                ('sunday', models.DurationField(default=datetime.timedelta(0), verbose_name='dimanche')),
+                ('comment', models.CharField(blank=True, max_length=1000, null=True, verbose_name='commentaire')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='capacity_patterns', related_query_name='capacity_pattern', to=settings.AUTH_USER_MODEL, verbose_name='utilisateur')),
+            ],
+            options={
+                'verbose_name': 'capacité hebdomadaire',
+                'verbose_name_plural': 'capacités hebdomadaires',
+                'ordering': ('-valid_from',),
+            },
+        ),
+    ]
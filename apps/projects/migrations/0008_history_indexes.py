@@ -0,0 +1,29 @@
+from django.db import migrations
+
+# historique d'un objet par date : pages d'historique de l'administration et
+# parcours de prune_history ; les modèles historiques étant générés par
+# simple_history, les index sont créés en SQL
+HISTORY_TABLES = [
+    "projects_historicalactivity",
+    "projects_historicalcapacity",
+    "projects_historicalcapacitypattern",
+    "projects_historicalleave",
+    "projects_historicallocation",
+    "projects_historicalproject",
+    "projects_historicalresource",
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0007_capacitypattern'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX "{0}_id_date_idx" ON "{0}" ("id", "history_date", "history_id");'.format(table),
+            'DROP INDEX "{0}_id_date_idx";'.format(table),
+        )
+        for table in HISTORY_TABLES
+    ]
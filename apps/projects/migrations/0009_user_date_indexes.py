@@ -0,0 +1,29 @@
+# Generated by Django 2.2.5 on 2026-10-18 15:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0008_history_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='activity',
+            index=models.Index(fields=['project', 'date'], name='activity_project_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='capacity',
+            index=models.Index(fields=['user', 'date'], name='capacity_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='leave',
+            index=models.Index(fields=['user', 'date'], name='leave_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resource',
+            index=models.Index(fields=['user', 'date'], name='resource_user_date_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 2.2.5 on 2026-10-18 15:49
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('projects', '0009_user_date_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardSnapshot',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='création')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='mise à jour')),
+                ('start_date', models.DateField(verbose_name='date')),
+                ('version', models.CharField(max_length=32)),
+                ('data', models.TextField(verbose_name='données')),
+                ('duration', models.FloatField(default=0, verbose_name='durée du calcul')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='dashboard_snapshot', to=settings.AUTH_USER_MODEL, verbose_name='utilisateur')),
+            ],
+            options={
+                'verbose_name': 'instantané du tableau de bord',
+                'verbose_name_plural': 'instantanés du tableau de bord',
+            },
+        ),
+    ]
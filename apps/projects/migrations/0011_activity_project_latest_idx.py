@@ -0,0 +1,21 @@
+# Generated by Django 2.2.5 on 2026-10-18 16:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0010_dashboardsnapshot'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='activity',
+            name='activity_project_date_idx',
+        ),
+        migrations.AddIndex(
+            model_name='activity',
+            index=models.Index(fields=['project', 'date', 'created_at'], name='activity_project_latest_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 2.2.5 on 2026-10-18 16:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0011_activity_project_latest_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='activity',
+            index=models.Index(fields=['updated_at'], name='activity_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='capacity',
+            index=models.Index(fields=['user', 'updated_at'], name='capacity_user_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='capacitypattern',
+            index=models.Index(fields=['user', 'updated_at'], name='pattern_user_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='leave',
+            index=models.Index(fields=['user', 'updated_at'], name='leave_user_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['updated_at'], name='project_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resource',
+            index=models.Index(fields=['updated_at'], name='resource_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,94 @@
+# Generated by Django 2.2.5 on 2026-10-18 17:05
+
+from datetime import timedelta
+from django.db import migrations
+from django.db.models import Sum
+
+NODE_FIELDS = ("spent", "allotted", "remaining_allotted", "remaining_needed", "margin")
+
+
+def durations(model):
+    return dict(
+        model.objects.order_by()
+        .values("project")
+        .annotate(total=Sum("duration"))
+        .values_list("project", "total")
+    )
+
+
+def backfill_project_stats(apps, schema_editor):
+    """
+        calcule ProjectStats comme projects.stats.rebuild(), avec les modèles de
+        la migration : valeurs propres de chaque projet, puis cumuls sur les
+        sous-arbres en une passe en ordre préfixe
+    """
+    Activity = apps.get_model("projects", "Activity")
+    Project = apps.get_model("projects", "Project")
+    ProjectStats = apps.get_model("projects", "ProjectStats")
+    Resource = apps.get_model("projects", "Resource")
+
+    spent = durations(Activity)
+    allotted = durations(Resource)
+    existing = {stats.project_id: stats for stats in ProjectStats.objects.all()}
+
+    created, updated = [], []
+    stack = []
+
+    def pop():
+        project, child = stack.pop()
+        if stack:
+            parent = stack[-1][1]
+            for field in NODE_FIELDS:
+                total_field = "total_" + field
+                setattr(
+                    parent,
+                    total_field,
+                    getattr(parent, total_field) + getattr(child, total_field),
+                )
+
+    for project in Project.objects.order_by("tree_id", "lft"):
+        stats = existing.get(project.pk)
+        if stats is None:
+            stats = ProjectStats(project_id=project.pk)
+            created.append(stats)
+        else:
+            updated.append(stats)
+
+        progression = project.last_progression or 0
+        stats.spent = spent.get(project.pk) or timedelta()
+        stats.allotted = allotted.get(project.pk) or timedelta()
+        stats.remaining_allotted = stats.allotted - stats.spent
+        if progression == 0:
+            stats.remaining_needed = stats.allotted
+        else:
+            stats.remaining_needed = stats.spent * (100 / progression - 1)
+        stats.margin = stats.remaining_allotted - stats.remaining_needed
+        for field in NODE_FIELDS:
+            setattr(stats, "total_" + field, getattr(stats, field))
+
+        while stack and (
+            stack[-1][0].tree_id != project.tree_id or stack[-1][0].rght < project.lft
+        ):
+            pop()
+        stack.append((project, stats))
+
+    while stack:
+        pop()
+
+    ProjectStats.objects.bulk_create(created, batch_size=500)
+    ProjectStats.objects.bulk_update(
+        updated,
+        NODE_FIELDS + tuple("total_" + field for field in NODE_FIELDS),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0012_updated_at_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_project_stats, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,13 @@
 import uuid
 from datetime import timedelta
 from decimal import Decimal
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models import OuterRef, Subquery, Sum
 from django.core.validators import MaxValueValidator, MinValueValidator
+from mptt.managers import TreeManager
 from mptt.models import MPTTModel, TreeForeignKey
+from mptt.querysets import TreeQuerySet
 import simple_history
 from simple_history.models import HistoricalRecords
 from accounts.models import CustomUser
@@ -36,6 +40,80 @@ def heures(td):
     return "h".join(str(td).split(":")[:2])
 
 
+def percent(done, remaining):
+    """
+        avancement en pourcentage entier d'après le temps passé et le temps
+        nécessaire restant
+    """
+    a = done.total_seconds()
+    b = a + remaining.total_seconds()
+    if b == 0:
+        return 0
+    else:
+        return int(100 * a / b)
+
+
+def duration_sum(queryset):
+    """
+        sous-requête renvoyant la somme des durées du queryset pour le projet courant
+    """
+    return Subquery(
+        queryset.filter(project=OuterRef("pk"))
+        .order_by()
+        .values("project")
+        .annotate(total=Sum("duration"))
+        .values("total"),
+        output_field=models.DurationField(),
+    )
+
+
+class ProjectQuerySet(TreeQuerySet):
+    def with_time_stats(self):
+        """
+            annote les projets avec le temps alloué et le temps passé, sommés par
+            la base de données
+        """
+        return self.annotate(
+            allotted_time_sum=duration_sum(Resource.objects.all()),
+            duration_sum=duration_sum(Activity.objects.all()),
+        )
+
+    def refresh_progression(self):
+        """
+            recalcule la dernière progression renseignée (et sa date) des projets,
+            renvoie le nombre de projets corrigés
+        """
+        latest = Activity.objects.filter(
+            project=OuterRef("pk"), progression__isnull=False
+        ).order_by("-date", "-created_at")
+        projects = self.annotate(
+            latest_progression=Subquery(latest.values("progression")[:1]),
+            latest_progression_date=Subquery(latest.values("date")[:1]),
+        )
+        changed = []
+        for project in projects:
+            if (project.last_progression, project.last_progression_date) != (
+                project.latest_progression,
+                project.latest_progression_date,
+            ):
+                project.last_progression = project.latest_progression
+                project.last_progression_date = project.latest_progression_date
+                changed.append(project)
+        Project.objects.bulk_update(
+            changed, ["last_progression", "last_progression_date"]
+        )
+        return len(changed)
+
+
+class ProjectManager(TreeManager.from_queryset(ProjectQuerySet)):
+    def _move_node(self, node, *args, **kwargs):
+        # ancêtres avant le déplacement, utilisés par projects.stats
+        node._previous_ancestor_ids = list(
+            node.get_ancestors().values_list("pk", flat=True)
+        )
+        return super()._move_node(node, *args, **kwargs)
+
+
 class Project(MPTTModel):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="création")
@@ -51,6 +129,15 @@ class Project(MPTTModel):
         null=True, blank=True, max_length=TEXT_MAX_LENGTH, verbose_name="commentaire"
     )
 
+    # dernière valeur de « progression » en date des objets « Activity » liés au
+    # projet, tenue à jour par projects.signals
+    last_progression = models.IntegerField(
+        null=True, blank=True, editable=False, verbose_name="avancement"
+    )
+    last_progression_date = models.DateField(
+        null=True, blank=True, editable=False, verbose_name="date de l'avancement"
+    )
+
     resources = models.ManyToManyField(
         CustomUser,
         through="Resource",
@@ -60,11 +147,20 @@ class Project(MPTTModel):
         verbose_name="ressources",
     )
 
+    objects = ProjectManager()
+
+    # indicateurs précalculés par projects.rollup.rollup_projects()
+    _metrics = None
+
     @property
     def allotted_time(self):
         """
             temps alloué au projet = somme des durées des ressources
         """
+        if self._metrics is not None:
+            return self._metrics.allotted_time
+        if hasattr(self, "allotted_time_sum"):
+            return self.allotted_time_sum or timedelta()
         t = timedelta()
         for resource in Resource.objects.filter(project=self):
             t += resource.duration
@@ -75,6 +171,8 @@ class Project(MPTTModel):
         """
             temps alloué cumulé pour le projet projet lui-même et de ses sous-projets
         """
+        if self._metrics is not None:
+            return self._metrics.total_allotted_time
         t = timedelta()
         for project in self.get_descendants(include_self=True):
             t += project.allotted_time
@@ -85,6 +183,10 @@ class Project(MPTTModel):
         """
             temps déjà passé sur le projet
         """
+        if self._metrics is not None:
+            return self._metrics.duration
+        if hasattr(self, "duration_sum"):
+            return self.duration_sum or timedelta()
         t = timedelta()
         for activity in self.activities.all():
             t += activity.duration
@@ -94,6 +196,8 @@ class Project(MPTTModel):
         """
             temps déjà passé sur le projet
         """
+        if getattr(self, "time_stats_user", None) == str(user.pk):
+            return self.duration_by_user_sum or timedelta()
         t = timedelta()
         for activity in self.activities.filter(user=user):
             t += activity.duration
@@ -104,6 +208,8 @@ class Project(MPTTModel):
         """
             temps déjà passé sur le projet, sous-projets inclus
         """
+        if self._metrics is not None:
+            return self._metrics.total
         t = timedelta()
         for activity in self.get_descendants(include_self=True):
             t += activity.duration
@@ -113,6 +219,10 @@ class Project(MPTTModel):
         """
             temps déjà passé sur le projet, sous-projets inclus
         """
+        if getattr(self, "time_stats_user", None) == str(user.pk) and hasattr(
+            self, "total_by_user_sum"
+        ):
+            return self.total_by_user_sum
         t = timedelta()
         for activity in self.get_descendants(include_self=True):
             t += activity.duration_by_user(user)
@@ -144,24 +254,26 @@ class Project(MPTTModel):
     @property
     def progression(self):
         # dernière valeur de « progression » en date pour les objets « Activity » liés au projet, si elle existe
-        activities = Activity.objects.filter(
-            project=self, progression__isnull=False
-        ).order_by("-date")
-        try:
-            progression = activities[0].progression
-        except:
-            return 0
-
-        return progression
+        if self._metrics is not None:
+            return self._metrics.progression
+        return self.last_progression or 0
 
     @property
     def total_progression(self):
-        a = self.total.seconds
-        b = a + self.total_remaining_time_needed.seconds
-        if b == 0:
-            return 0
-        else:
-            return int(100 * a / b)
+        return percent(self.total, self.total_remaining_time_needed)
+
+    @property
+    def label_progression(self):
+        """
+            avancement cumulé lu dans ProjectStats (chargé par
+            select_related("stats") dans les listes), recalculé à défaut
+        """
+        if self._metrics is None:
+            try:
+                return self.stats.total_progression
+            except ProjectStats.DoesNotExist:
+                pass
+        return self.total_progression
 
     @property
     def is_completed(self):
@@ -186,6 +298,8 @@ class Project(MPTTModel):
 
     @property
     def total_remaining_time_needed(self):
+        if self._metrics is not None:
+            return self._metrics.total_remaining_time_needed
         t = timedelta()
         for project in self.get_descendants(include_self=True):
             t += project.remaining_time_needed
@@ -201,17 +315,73 @@ class Project(MPTTModel):
 
     def __str__(self):
         return "{}{} ({}%)".format(
-            self.level_text_simple, self.title, self.total_progression
+            self.level_text_simple, self.title, self.label_progression
         )
 
     class Meta:
         verbose_name = "projet"
         verbose_name_plural = "projets"
+        indexes = [
+            # empreinte des données (ETag, metrics_worker)
+            models.Index(fields=["updated_at"], name="project_updated_idx")
+        ]
 
 
 simple_history.register(Project)
 
 
+class ProjectStats(models.Model):
+    """
+        indicateurs du projet seul et de son sous-arbre, tenus à jour par
+        projects.stats pour pouvoir les trier et les filtrer
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="création")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="mise à jour")
+
+    project = models.OneToOneField(
+        Project, on_delete=models.CASCADE, related_name="stats", verbose_name="projet"
+    )
+
+    spent = models.DurationField(default=timedelta(), verbose_name="temps passé")
+    allotted = models.DurationField(default=timedelta(), verbose_name="temps alloué")
+    remaining_allotted = models.DurationField(
+        default=timedelta(), verbose_name="temps alloué restant"
+    )
+    remaining_needed = models.DurationField(
+        default=timedelta(), verbose_name="temps nécessaire"
+    )
+    margin = models.DurationField(default=timedelta(), verbose_name="marge")
+
+    total_spent = models.DurationField(
+        default=timedelta(), verbose_name="temps passé cumulé"
+    )
+    total_allotted = models.DurationField(
+        default=timedelta(), verbose_name="temps alloué cumulé"
+    )
+    total_remaining_allotted = models.DurationField(
+        default=timedelta(), verbose_name="temps alloué restant cumulé"
+    )
+    total_remaining_needed = models.DurationField(
+        default=timedelta(), verbose_name="temps nécessaire cumulé"
+    )
+    total_margin = models.DurationField(
+        default=timedelta(), verbose_name="marge cumulée"
+    )
+
+    @property
+    def total_progression(self):
+        return percent(self.total_spent, self.total_remaining_needed)
+
+    def __str__(self):
+        return "{}".format(self.project.title)
+
+    class Meta:
+        verbose_name = "statistiques de projet"
+        verbose_name_plural = "statistiques de projets"
+
+
 class Activity(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="création")
@@ -264,6 +434,20 @@ class Activity(models.Model):
         verbose_name = "activité"
         verbose_name_plural = "activités"
         ordering = ("-date",)
+        indexes = [
+            # relevé d'heures paginé par curseur (date, id)
+            models.Index(
+                fields=["user", "date", "id"], name="activity_user_date_id_idx"
+            ),
+            # dernière progression renseignée d'un projet, dans l'ordre de la
+            # recherche (date puis création) pour éviter un tri
+            models.Index(
+                fields=["project", "date", "created_at"],
+                name="activity_project_latest_idx",
+            ),
+            # empreinte des données (ETag, metrics_worker)
+            models.Index(fields=["updated_at"], name="activity_updated_idx"),
+        ]
 
 
 class Leave(models.Model):
@@ -319,6 +503,12 @@ class Leave(models.Model):
         verbose_name = "absence"
         verbose_name_plural = "absences"
         ordering = ("-date",)
+        indexes = [
+            # absences d'un utilisateur sur une période (planning, solde)
+            models.Index(fields=["user", "date"], name="leave_user_date_idx"),
+            # empreinte des données d'un utilisateur (ETag, metrics_worker)
+            models.Index(fields=["user", "updated_at"], name="leave_user_updated_idx"),
+        ]
 
 
 class Resource(models.Model):
@@ -357,6 +547,12 @@ class Resource(models.Model):
         verbose_name = "ressource"
         verbose_name_plural = "ressources"
         ordering = ("-date",)
+        indexes = [
+            # réservations datées d'un utilisateur sur une période (planning)
+            models.Index(fields=["user", "date"], name="resource_user_date_idx"),
+            # empreinte des données (ETag, metrics_worker)
+            models.Index(fields=["updated_at"], name="resource_updated_idx"),
+        ]
 
 
 class Capacity(models.Model):
@@ -387,3 +583,149 @@ class Capacity(models.Model):
         verbose_name = "capacité"
         verbose_name_plural = "capacités"
         ordering = ("-date",)
+        indexes = [
+            # capacités d'un utilisateur sur une période (planning, solde)
+            models.Index(fields=["user", "date"], name="capacity_user_date_idx"),
+            # empreinte des données d'un utilisateur (ETag, metrics_worker)
+            models.Index(
+                fields=["user", "updated_at"], name="capacity_user_updated_idx"
+            ),
+        ]
+
+
+class CapacityPattern(models.Model):
+    """
+        capacité hebdomadaire récurrente d'un utilisateur, du valid_from au
+        valid_to inclus (sans fin si vide) ; les objets « Capacity » d'un jour la
+        remplacent pour ce jour, et le modèle commençant le plus tard l'emporte
+        sur les précédents
+    """
+
+    WEEKDAYS = (
+        "monday",
+        "tuesday",
+        "wednesday",
+        "thursday",
+        "friday",
+        "saturday",
+        "sunday",
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="création")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="mise à jour")
+    history = HistoricalRecords()
+
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=models.PROTECT,
+        related_name="capacity_patterns",
+        related_query_name="capacity_pattern",
+        verbose_name="utilisateur",
+    )
+
+    valid_from = models.DateField(verbose_name="à partir du")
+    valid_to = models.DateField(null=True, blank=True, verbose_name="jusqu'au")
+
+    monday = models.DurationField(default=DAILY_WORKING_TIME, verbose_name="lundi")
+    tuesday = models.DurationField(default=DAILY_WORKING_TIME, verbose_name="mardi")
+    wednesday = models.DurationField(
+        default=DAILY_WORKING_TIME, verbose_name="mercredi"
+    )
+    thursday = models.DurationField(default=DAILY_WORKING_TIME, verbose_name="jeudi")
+    friday = models.DurationField(default=DAILY_WORKING_TIME, verbose_name="vendredi")
+    saturday = models.DurationField(default=timedelta(), verbose_name="samedi")
+    sunday = models.DurationField(default=timedelta(), verbose_name="dimanche")
+
+    comment = models.CharField(
+        null=True, blank=True, max_length=TEXT_MAX_LENGTH, verbose_name="commentaire"
+    )
+
+    def weekly(self):
+        """
+            durées du lundi au dimanche
+        """
+        return [getattr(self, weekday) for weekday in self.WEEKDAYS]
+
+    def clean(self):
+        if self.valid_to is not None and self.valid_to < self.valid_from:
+            raise ValidationError(
+                {"valid_to": "La fin doit suivre le début de la période."}
+            )
+
+    def __str__(self):
+        if self.valid_to:
+            return "{} du {} au {}".format(self.user, self.valid_from, self.valid_to)
+        return "{} à partir du {}".format(self.user, self.valid_from)
+
+    class Meta:
+        verbose_name = "capacité hebdomadaire"
+        verbose_name_plural = "capacités hebdomadaires"
+        ordering = ("-valid_from",)
+        indexes = [
+            # empreinte des données d'un utilisateur (ETag, metrics_worker)
+            models.Index(fields=["user", "updated_at"], name="pattern_user_updated_idx")
+        ]
+
+
+class BalanceCheckpoint(models.Model):
+    """
+        solde d'heures cumulé d'un utilisateur au premier jour d'un mois, hors solde
+        de départ ; tenu à jour par projects.balance
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="création")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="mise à jour")
+
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name="balance_checkpoints",
+        related_query_name="balance_checkpoint",
+        verbose_name="utilisateur",
+    )
+
+    # premier jour du mois : le solde porte sur tous les jours qui le précèdent
+    month = models.DateField(verbose_name="mois")
+    balance = models.DurationField(default=timedelta(), verbose_name="solde")
+
+    def __str__(self):
+        return "{} au {}".format(heures(self.balance), self.month)
+
+    class Meta:
+        verbose_name = "point de solde"
+        verbose_name_plural = "points de solde"
+        ordering = ("-month",)
+        unique_together = ("user", "month")
+
+
+class DashboardSnapshot(models.Model):
+    """
+        tableau de bord d'un utilisateur précalculé par metrics_worker, valable
+        tant que l'empreinte des données dont il dépend (version) n'a pas changé ;
+        lu et écrit par projects.snapshots
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="création")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="mise à jour")
+
+    user = models.OneToOneField(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name="dashboard_snapshot",
+        verbose_name="utilisateur",
+    )
+
+    start_date = models.DateField(verbose_name="date")
+    version = models.CharField(max_length=32)
+    data = models.TextField(verbose_name="données")
+    duration = models.FloatField(default=0, verbose_name="durée du calcul")
+
+    def __str__(self):
+        return "{} au {}".format(self.user, self.start_date)
+
+    class Meta:
+        verbose_name = "instantané du tableau de bord"
+        verbose_name_plural = "instantanés du tableau de bord"
@@ -0,0 +1,293 @@
+from bisect import bisect_left
+from datetime import timedelta
+from itertools import accumulate
+from django.db.models import Max, Q, Sum
+from accounts.models import CustomUser
+from projects.balance import get_balance
+from projects.capacity import (
+    capacities_by_user_date,
+    durations_by_user_date,
+    last_capacity_dates,
+)
+from projects.models import Leave, Project, Resource
+
+ZERO = timedelta()
+
+
+def date_range(start_date, end_date):
+    """
+        jours de start_date à end_date inclus
+    """
+    return [
+        start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)
+    ]
+
+
+def dense(by_user_date, user_id, dates):
+    """
+        tableau d'une valeur par jour de dates, les jours absents valant 0
+    """
+    return [by_user_date.get((user_id, date), ZERO) for date in dates]
+
+
+def absorption(cumulated, load):
+    """
+        indice du premier jour où le temps disponible cumulé couvre la charge, None
+        si la période n'y suffit pas
+    """
+    if load <= ZERO:
+        return 0
+    i = bisect_left(cumulated, load)
+    return i if i < len(cumulated) else None
+
+
+class UserForecast:
+    """
+        prévision d'un utilisateur : planning jour par jour, charge de travail
+        restante par projet et prochaine disponibilité (None au-delà de end_date)
+    """
+
+    def __init__(self, user, start_date, end_date):
+        self.user = user
+        self.start_date = start_date
+        self.end_date = end_date
+        self.day_number = max((end_date - start_date).days + 1, 0)
+
+        self.project_loads = {}
+        self.total_load = ZERO
+        self.next_available_date = None
+        # date à laquelle la part de l'utilisateur dans chaque projet est faite
+        self.completion_dates = {}
+
+    def date(self, i):
+        return None if i is None else self.start_date + timedelta(days=i)
+
+    def allocate(self, queue, last_bookings):
+        """
+            répartit la charge au plus tôt sur le temps disponible, projet après
+            projet dans l'ordre de queue [(projet, charge)]
+        """
+        available_list = [
+            capacity - booked - leave
+            for capacity, booked, leave in zip(
+                self.capacity_list, self.booked_list, self.leave_list
+            )
+        ]
+        cumulated = list(
+            accumulate(max(available, ZERO) for available in available_list)
+        )
+
+        self.next_available_date = self.date(absorption(cumulated, self.total_load))
+        self.available_list = [
+            available
+            if available <= ZERO
+            else max(ZERO, min(available, total - self.total_load))
+            for available, total in zip(available_list, cumulated)
+        ]
+
+        load = ZERO
+        for project, project_load in queue:
+            load += project_load
+            date = self.date(absorption(cumulated, load))
+            last_booking = last_bookings.get(project.pk)
+            if date is not None and last_booking is not None:
+                date = max(date, last_booking)
+            self.completion_dates[project.pk] = date
+
+    def planning(self):
+        """
+            planning au format du tableau de bord
+        """
+        return {
+            "delta": (self.end_date - self.start_date).days + 1,
+            "date_list": [self.date(i) for i in range(self.day_number)],
+            "capacity_list": self.capacity_list,
+            "booked_list": self.booked_list,
+            "leave_list": self.leave_list,
+            "available_list": self.available_list,
+            "next_available_date": self.next_available_date,
+        }
+
+
+class ProjectForecast:
+    """
+        prévision d'un projet : charge restante répartie entre les utilisateurs et
+        date d'achèvement projetée (None au-delà de l'horizon d'un des utilisateurs)
+    """
+
+    def __init__(self, project):
+        self.project = project
+        self.load = ZERO
+        self.completion_date = None
+        self.user_forecasts = []
+
+    def complete(self):
+        dates = [uf.completion_dates[self.project.pk] for uf in self.user_forecasts]
+        if dates and None not in dates:
+            self.completion_date = max(dates)
+
+
+class TeamForecast:
+    """
+        prévision de charge de toute l'équipe en un seul passage, à partir du jour
+        start_date et jusqu'à la dernière capacité connue de chaque utilisateur
+        (ou jusqu'à end_date)
+
+        Capacités, absences et réservations datées sont lues en requêtes groupées
+        par utilisateur et par jour (les capacités hebdomadaires sont dépliées en
+        mémoire), les parts de travail restant des projets en deux requêtes, quel
+        que soit le nombre d'utilisateurs. La charge d'un utilisateur sur un projet
+        est sa part du temps alloué appliquée au temps nécessaire restant, moins
+        ses réservations datées, déjà comptées dans son planning ; elle est
+        absorbée au plus tôt par le temps disponible cumulé.
+    """
+
+    def __init__(self, start_date, users=None, end_date=None):
+        self.start_date = start_date
+        if users is None:
+            users = CustomUser.objects.filter(is_active=True)
+        self.users = list(users)
+        self.end_date = end_date
+
+    def end_dates(self):
+        if self.end_date is not None:
+            return {user.pk: self.end_date for user in self.users}
+        last_dates = last_capacity_dates(self.users, self.start_date)
+        return {
+            user.pk: last_dates.get(user.pk, self.start_date) for user in self.users
+        }
+
+    def shares(self):
+        """
+            temps alloué à chaque utilisateur sur chaque projet, dont réservations
+            datées, et dernière réservation à venir : {(user_id, project_id): ...}
+        """
+        rows = (
+            Resource.objects.filter(user__in=self.users)
+            .order_by()
+            .values("user", "project")
+            .annotate(
+                total=Sum("duration"),
+                dated=Sum("duration", filter=Q(date__isnull=False)),
+                last_booking=Max("date", filter=Q(date__gte=self.start_date)),
+            )
+        )
+        return {(row["user"], row["project"]): row for row in rows}
+
+    def run(self):
+        start_date = self.start_date
+        end_dates = self.end_dates()
+        end_date = max([start_date] + list(end_dates.values()))
+
+        capacities = capacities_by_user_date(self.users, start_date, end_date)
+        leaves, bookings = (
+            durations_by_user_date(
+                model.objects.filter(user__in=self.users), start_date, end_date
+            )
+            for model in (Leave, Resource)
+        )
+        shares = self.shares()
+        projects = list(
+            Project.objects.filter(resource__user__in=self.users)
+            .distinct()
+            .with_time_stats()
+        )
+
+        dates = date_range(start_date, end_date)
+        self.user_forecasts = []
+        self.project_forecasts = [ProjectForecast(project) for project in projects]
+        for user in self.users:
+            uf = UserForecast(user, start_date, end_dates[user.pk])
+            user_dates = dates[: uf.day_number]
+            uf.capacity_list = dense(capacities, user.pk, user_dates)
+            uf.booked_list = dense(bookings, user.pk, user_dates)
+            uf.leave_list = dense(leaves, user.pk, user_dates)
+
+            queue = []
+            last_bookings = {}
+            for pf in self.project_forecasts:
+                project = pf.project
+                share = shares.get((user.pk, project.pk))
+                if share is None:
+                    continue
+                t_total = project.allotted_time
+                r = share["total"] / t_total if t_total else 1
+                load = r * project.remaining_time_needed
+                uf.project_loads[project] = load
+                queue.append((project, load - (share["dated"] or ZERO)))
+                last_bookings[project.pk] = share["last_booking"]
+                uf.total_load += queue[-1][1]
+                pf.load += load
+                pf.user_forecasts.append(uf)
+
+            uf.allocate(queue, last_bookings)
+            self.user_forecasts.append(uf)
+
+        for pf in self.project_forecasts:
+            pf.complete()
+        return self
+
+
+def team_heatmap(start_date, end_date, users=None):
+    """
+        grille utilisateurs × jours de la capacité, des absences, du temps réservé
+        et du temps libre, en requêtes groupées par utilisateur et par jour :
+        (liste des jours, [{"user", "capacity", "leave", "booked", "free"}])
+    """
+    if users is None:
+        users = CustomUser.objects.filter(is_active=True)
+    users = list(users)
+    dates = date_range(start_date, end_date)
+
+    capacities = capacities_by_user_date(users, start_date, end_date)
+    leaves, bookings = (
+        durations_by_user_date(
+            model.objects.filter(user__in=users), start_date, end_date
+        )
+        for model in (Leave, Resource)
+    )
+
+    rows = []
+    for user in users:
+        row = {
+            "user": user,
+            "capacity": dense(capacities, user.pk, dates),
+            "leave": dense(leaves, user.pk, dates),
+            "booked": dense(bookings, user.pk, dates),
+        }
+        row["free"] = [
+            capacity - leave - booked
+            for capacity, leave, booked in zip(
+                row["capacity"], row["leave"], row["booked"]
+            )
+        ]
+        rows.append(row)
+    return dates, rows
+
+
+def dashboard(user, start_date):
+    """
+        chiffres du tableau de bord : charge de travail, planning, prochaine
+        disponibilité et solde d'heures de la veille
+    """
+    uf = TeamForecast(start_date, users=[user]).run().user_forecasts[0]
+
+    context = {}
+    context["total_load"] = uf.total_load
+
+    context.update(uf.planning())
+    # la charge non absorbée sur la période est affichée au jour même
+    context["next_available_date"] = uf.next_available_date or start_date
+    context["start_date"] = start_date
+    context["end_date"] = uf.end_date
+    context["project_list"] = {
+        project.title: load for project, load in uf.project_loads.items()
+    }
+
+    # calcul du solde d'heures
+    the_day_before = start_date - timedelta(days=1)
+
+    context["balance"] = get_balance(user, the_day_before)
+    context["the_day_before"] = the_day_before
+
+    return context
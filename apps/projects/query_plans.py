@@ -0,0 +1,104 @@
+import re
+from datetime import timedelta
+from django.db import connection
+from django.db.models import OuterRef, Subquery
+from django.test import RequestFactory
+from projects.capacity import daily_durations
+from projects.models import Activity, Capacity, Leave, Project, Resource
+from projects.reports import PivotReport, PresenceReport
+from projects.rollup import user_durations
+from projects.views import ActivityListView, ProjectDetailByUserView
+
+# lignes de plan signalant le parcours complet d'une table : « SCAN table » sans
+# index (hors sous-requêtes matérialisées) pour SQLite, « Seq Scan » pour
+# PostgreSQL
+FULL_SCAN_RES = {
+    "sqlite": re.compile(
+        r"\bSCAN (?:TABLE )?(?!SUBQUERY\b|CONSTANT\b)\w+(?! USING (?:COVERING )?INDEX)\b"
+    ),
+    "postgresql": re.compile(r"\bSeq Scan on\b"),
+}
+
+# tri en mémoire ou sur disque du résultat, faute d'index dans le bon ordre
+SORT_RES = {
+    "sqlite": re.compile(r"\bUSE TEMP B-TREE FOR (?:\w+ PART OF )?ORDER BY\b"),
+    "postgresql": re.compile(r"\bSort\b"),
+}
+
+
+def view_queryset(view_class, user, **kwargs):
+    """
+        requête d'une vue de liste pour l'utilisateur connecté user
+    """
+    request = RequestFactory().get("/")
+    request.user = user
+    view = view_class()
+    view.setup(request, **kwargs)
+    return view.get_queryset()
+
+
+def hot_paths(user, project, date):
+    """
+        requêtes représentatives des vues et calculs les plus sollicités, pour
+        l'utilisateur user, le projet project et le jour date : [(nom, requête)]
+    """
+    activities = view_queryset(ActivityListView, user)
+    latest = Activity.objects.filter(
+        project=OuterRef("pk"), progression__isnull=False
+    ).order_by("-date", "-created_at")
+    paths = [
+        ("ActivityListView", activities[:50]),
+        ("ActivityListView (curseur)", activities.filter(date__lt=date)[:50]),
+        ("ProjectListByUserView", user_durations(user)),
+        (
+            "ProjectDetailByUserView",
+            view_queryset(
+                ProjectDetailByUserView, user, pk=project.pk, username=user.username
+            ),
+        ),
+        (
+            "progression",
+            Project.objects.filter(pk=project.pk).annotate(
+                latest_date=Subquery(latest.values("date")[:1])
+            ),
+        ),
+    ]
+    year_start = date.replace(month=1, day=1)
+    paths += [
+        ("rapport par projet", PivotReport(year_start, date).aggregate()),
+        (
+            "rapport de présence",
+            PresenceReport(year_start, date, users=[user]).aggregate(),
+        ),
+    ]
+    for name, model in (
+        ("absences", Leave),
+        ("capacités", Capacity),
+        ("réservations", Resource),
+    ):
+        queryset = daily_durations(
+            model.objects.filter(user__in=[user]), date, date + timedelta(days=90)
+        )
+        paths.append(("planning : " + name, queryset))
+    return paths
+
+
+def matching_lines(regexes, plan, vendor=None):
+    regex = regexes.get(vendor or connection.vendor)
+    if regex is None:
+        return []
+    return [line.strip() for line in plan.splitlines() if regex.search(line)]
+
+
+def full_scans(plan, vendor=None):
+    """
+        lignes du plan parcourant une table entière
+    """
+    return matching_lines(FULL_SCAN_RES, plan, vendor)
+
+
+def sorts(plan, vendor=None):
+    """
+        lignes du plan triant le résultat sans index
+    """
+    return matching_lines(SORT_RES, plan, vendor)
@@ -0,0 +1,293 @@
+import csv
+from datetime import timedelta
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+from accounts.models import CustomUser
+from projects.exports import Echo, format_hours, hours
+from projects.models import Activity, Location, Project
+
+ZERO = timedelta()
+
+# fonction de troncature de la date d'une activité au début de sa période
+PERIODS = {"week": TruncWeek, "month": TruncMonth}
+
+
+def period_start(date, period):
+    if period == "week":
+        return date - timedelta(days=date.weekday())
+    return date.replace(day=1)
+
+
+def next_period(date, period):
+    if period == "week":
+        return date + timedelta(days=7)
+    return (date + timedelta(days=31)).replace(day=1)
+
+
+def period_range(start_date, end_date, period):
+    """
+        débuts des périodes (lundis ou premiers du mois) couvrant la période
+    """
+    dates = []
+    date = period_start(start_date, period)
+    while date <= end_date:
+        dates.append(date)
+        date = next_period(date, period)
+    return dates
+
+
+def period_label(date, period):
+    if period == "week":
+        year, week, weekday = date.isocalendar()
+        return "{}-S{:02d}".format(year, week)
+    return "{:%Y-%m}".format(date)
+
+
+def activities(start_date, end_date, users=None, root=None):
+    """
+        activités de la période (bornes incluses), des utilisateurs users et du
+        sous-arbre de root s'ils sont donnés
+    """
+    queryset = Activity.objects.filter(date__gte=start_date, date__lte=end_date)
+    if users is not None:
+        queryset = queryset.filter(user__in=users)
+    if root is not None:
+        queryset = queryset.filter(
+            project__tree_id=root.tree_id,
+            project__lft__gte=root.lft,
+            project__rght__lte=root.rght,
+        )
+    return queryset.order_by()
+
+
+def project_groups(level, root=None):
+    """
+        projet de rattachement de chaque projet : son ancêtre au niveau level, ou
+        lui-même s'il est moins profond ; une seule requête, l'arbre étant
+        parcouru en ordre préfixe grâce à lft/rght : ({project_id: groupe},
+        {project_id: projet}). Sous root, le niveau ne peut être inférieur à
+        celui de root : le sous-arbre est au moins cumulé sur root.
+    """
+    projects = Project.objects.order_by("tree_id", "lft")
+    if root is not None:
+        level = max(level, root.level)
+        projects = projects.filter(
+            tree_id=root.tree_id, lft__gte=root.lft, rght__lte=root.rght
+        )
+
+    # la pile contient les ancêtres du projet courant
+    stack = []
+    groups, by_id = {}, {}
+    for project in projects.only("id", "title", "tree_id", "lft", "rght", "level"):
+        while stack and (
+            stack[-1].tree_id != project.tree_id or stack[-1].rght < project.lft
+        ):
+            stack.pop()
+        stack.append(project)
+        by_id[project.pk] = project
+        groups[project.pk] = next(
+            (ancestor.pk for ancestor in stack if ancestor.level == level), project.pk
+        )
+    return groups, by_id
+
+
+class PivotReport:
+    """
+        temps passé par utilisateur, projet et période (semaine ou mois), entre
+        start_date et end_date inclus : une seule agrégation GROUP BY utilisateur,
+        projet, période sur les activités, chargée dans un tableau dense
+        utilisateurs × projets × périodes où les projets sont cumulés sur leur
+        ancêtre au niveau level de l'arbre (les plus hauts par défaut) ; users et
+        root restreignent le rapport à des utilisateurs et à un sous-arbre
+    """
+
+    def __init__(
+        self, start_date, end_date, period="month", level=0, users=None, root=None
+    ):
+        if period not in PERIODS:
+            raise ValueError("période inconnue : {}".format(period))
+        self.start_date = start_date
+        self.end_date = end_date
+        self.period = period
+        self.level = level
+        self.users = users
+        self.root = root
+
+    def aggregate(self):
+        """
+            (user_id, project_id, début de période, durée), sans charger les
+            activités
+        """
+        return (
+            activities(self.start_date, self.end_date, self.users, self.root)
+            .annotate(period=PERIODS[self.period]("date"))
+            .values("user", "project", "period")
+            .annotate(total=Sum("duration"))
+            .values_list("user", "project", "period", "total")
+        )
+
+    def run(self):
+        rows = list(self.aggregate())
+        groups, projects = project_groups(self.level, self.root)
+
+        self.periods = period_range(self.start_date, self.end_date, self.period)
+        period_index = {date: i for i, date in enumerate(self.periods)}
+        self.user_list = list(
+            CustomUser.objects.filter(
+                pk__in={user_id for user_id, _, _, _ in rows}
+            ).order_by("username")
+        )
+        user_index = {user.pk: i for i, user in enumerate(self.user_list)}
+        # projets de rattachement en ordre d'arbre
+        group_ids = {groups[project_id] for _, project_id, _, _ in rows}
+        self.project_list = [
+            project for pk, project in projects.items() if pk in group_ids
+        ]
+        project_index = {project.pk: i for i, project in enumerate(self.project_list)}
+
+        self.cells = [
+            [[ZERO] * len(self.periods) for project in self.project_list]
+            for user in self.user_list
+        ]
+        for user_id, project_id, date, total in rows:
+            self.cells[user_index[user_id]][project_index[groups[project_id]]][
+                period_index[date]
+            ] += total
+        return self
+
+    def labels(self):
+        return [period_label(date, self.period) for date in self.periods]
+
+    def rows(self):
+        """
+            lignes non vides du rapport : (utilisateur, projet, durées par
+            période, total)
+        """
+        for user, user_cells in zip(self.user_list, self.cells):
+            for project, values in zip(self.project_list, user_cells):
+                total = sum(values, ZERO)
+                if total:
+                    yield user, project, values, total
+
+    def totals(self):
+        """
+            total de chaque période et total général
+        """
+        totals = [ZERO] * len(self.periods)
+        for user_cells in self.cells:
+            for values in user_cells:
+                totals = [a + b for a, b in zip(totals, values)]
+        return totals, sum(totals, ZERO)
+
+    def csv_lines(self, delimiter=","):
+        """
+            lignes CSV, une par utilisateur et projet, une colonne par période
+        """
+        writer = csv.writer(Echo(), delimiter=delimiter)
+        yield writer.writerow(
+            ["user", "project", "project_title"] + self.labels() + ["total"]
+        )
+        for user, project, values, total in self.rows():
+            yield writer.writerow(
+                [user.username, project.pk, project.title]
+                + [format_hours(value) for value in values]
+                + [format_hours(total)]
+            )
+
+    def as_json(self):
+        totals, total = self.totals()
+        return {
+            "start": self.start_date.isoformat(),
+            "end": self.end_date.isoformat(),
+            "period": self.period,
+            "level": self.level,
+            "periods": self.labels(),
+            "rows": [
+                {
+                    "username": user.username,
+                    "project": str(project.pk),
+                    "title": project.title,
+                    "hours": [hours(value) for value in values],
+                    "total": hours(row_total),
+                }
+                for user, project, values, row_total in self.rows()
+            ],
+            "totals": [hours(value) for value in totals],
+            "total": hours(total),
+        }
+
+
+def days(condition=None):
+    """
+        nombre de jours distincts ayant au moins une activité (remplissant
+        condition)
+    """
+    return Count("date", distinct=True, filter=condition)
+
+
+class PresenceReport:
+    """
+        jours travaillés, de télétravail, de déplacement et par localisation de
+        chaque utilisateur, mois par mois, entre start_date et end_date inclus :
+        une seule agrégation conditionnelle GROUP BY utilisateur, mois, qui compte
+        les dates distinctes (une journée de plusieurs activités compte une fois) ;
+        users et root restreignent le rapport à des utilisateurs et à un
+        sous-arbre de projets
+    """
+
+    def __init__(self, start_date, end_date, users=None, root=None):
+        self.start_date = start_date
+        self.end_date = end_date
+        self.users = users
+        self.root = root
+
+    def aggregate(self):
+        """
+            une ligne par utilisateur et mois, une colonne location_<i> par
+            localisation de location_list
+        """
+        self.location_list = list(Location.objects.order_by("title"))
+        return (
+            activities(self.start_date, self.end_date, self.users, self.root)
+            .annotate(month=TruncMonth("date"))
+            .values("user__username", "month")
+            .annotate(
+                days=days(),
+                telework_days=days(Q(is_teleworking=True)),
+                business_trip_days=days(Q(is_business_trip=True)),
+                **{
+                    "location_{}".format(i): days(Q(location=location))
+                    for i, location in enumerate(self.location_list)
+                }
+            )
+            .order_by("user__username", "month")
+        )
+
+    def run(self):
+        self.rows = list(self.aggregate())
+        for row in self.rows:
+            row["locations"] = [
+                row.pop("location_{}".format(i)) for i in range(len(self.location_list))
+            ]
+        return self
+
+    def csv_lines(self, delimiter=","):
+        """
+            lignes CSV, une par utilisateur et mois, une colonne par localisation
+        """
+        writer = csv.writer(Echo(), delimiter=delimiter)
+        yield writer.writerow(
+            ["user", "month", "days", "telework_days", "business_trip_days"]
+            + [location.title for location in self.location_list]
+        )
+        for row in self.rows:
+            yield writer.writerow(
+                [
+                    row["user__username"],
+                    period_label(row["month"], "month"),
+                    row["days"],
+                    row["telework_days"],
+                    row["business_trip_days"],
+                ]
+                + row["locations"]
+            )
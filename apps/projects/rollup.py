@@ -0,0 +1,127 @@
+from datetime import timedelta
+from django.db.models import Sum
+from projects.models import Activity, Project
+
+
+class ProjectMetrics:
+    """
+        indicateurs d'un projet : valeurs propres au projet et valeurs cumulées
+        sur son sous-arbre
+    """
+
+    def __init__(self, allotted_time, duration, progression):
+        self.allotted_time = allotted_time
+        self.duration = duration
+        self.progression = progression
+
+        # complétés par rollup_projects() une fois le sous-arbre parcouru
+        self.total_allotted_time = allotted_time
+        self.total = duration
+        self.total_remaining_time_needed = timedelta()
+
+    def add(self, child):
+        """
+            cumule les indicateurs du sous-arbre d'un enfant
+        """
+        self.total_allotted_time += child.total_allotted_time
+        self.total += child.total
+        self.total_remaining_time_needed += child.total_remaining_time_needed
+
+
+def rollup_projects(queryset=None):
+    """
+        charge l'arbre des projets et calcule tous les indicateurs (temps alloué,
+        temps passé, avancement, cumuls des sous-projets) en une seule requête,
+        puis les agrège en une seule passe grâce à lft/rght.
+
+        Le queryset doit contenir des sous-arbres complets (tout l'arbre, ou
+        project.get_descendants(include_self=True)).
+    """
+    if queryset is None:
+        queryset = Project.objects.all()
+
+    projects = list(queryset.with_time_stats().order_by("tree_id", "lft"))
+
+    # parcours en ordre préfixe : la pile contient les ancêtres du projet courant,
+    # un projet est dépilé (et cumulé dans son parent) dès que son sous-arbre est fini
+    stack = []
+
+    def pop():
+        child = stack.pop()
+        if stack:
+            stack[-1]._metrics.add(child._metrics)
+
+    for project in projects:
+        project._metrics = ProjectMetrics(
+            project.allotted_time, project.duration, project.progression
+        )
+        project._metrics.total_remaining_time_needed = project.remaining_time_needed
+
+        while stack and (
+            stack[-1].tree_id != project.tree_id or stack[-1].rght < project.lft
+        ):
+            pop()
+        stack.append(project)
+
+    while stack:
+        pop()
+
+    return projects
+
+
+def user_durations(user):
+    """
+        temps passé par l'utilisateur sur chaque projet, en une requête groupée :
+        (project_id, durée)
+    """
+    return (
+        Activity.objects.filter(user=user)
+        .order_by()
+        .values("project")
+        .annotate(total=Sum("duration"))
+        .values_list("project", "total")
+    )
+
+
+def rollup_user_projects(user):
+    """
+        projets sur lesquels l'utilisateur a passé du temps, et leurs ancêtres, en
+        ordre d'arbre : temps passé sur le projet (duration_by_user_sum) et sur
+        son sous-arbre (total_by_user_sum), cumulé en mémoire en une seule passe
+        grâce à lft/rght
+    """
+    durations = dict(user_durations(user))
+    projects = Project.objects.filter(
+        tree_id__in=Project.objects.filter(
+            pk__in=Activity.objects.filter(user=user).values("project")
+        ).values("tree_id")
+    ).order_by("tree_id", "lft")
+
+    # parcours en ordre préfixe comme dans rollup_projects() ; un projet n'est
+    # gardé que si l'utilisateur a une activité dans son sous-arbre
+    stack = []
+    kept = []
+
+    def pop():
+        child = stack.pop()
+        if stack:
+            stack[-1].total_by_user_sum += child.total_by_user_sum
+            stack[-1].has_user_activity |= child.has_user_activity
+
+    for project in projects:
+        project.time_stats_user = str(user.pk)
+        project.duration_by_user_sum = durations.get(project.pk, timedelta())
+        project.total_by_user_sum = project.duration_by_user_sum
+        project.has_user_activity = project.pk in durations
+
+        while stack and (
+            stack[-1].tree_id != project.tree_id or stack[-1].rght < project.lft
+        ):
+            pop()
+        stack.append(project)
+        kept.append(project)
+
+    while stack:
+        pop()
+
+    return [project for project in kept if project.has_user_activity]
@@ -0,0 +1,158 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from mptt.signals import node_moved
+from projects import balance, metrics_cache, stats
+from projects.models import (
+    Activity,
+    Capacity,
+    CapacityPattern,
+    Leave,
+    Project,
+    ProjectStats,
+    Resource,
+)
+
+
+@receiver(pre_save, sender=Activity)
+@receiver(pre_save, sender=Leave)
+@receiver(pre_save, sender=Capacity)
+@receiver(pre_save, sender=CapacityPattern)
+@receiver(pre_save, sender=Resource)
+def remember_previous(sender, instance, **kwargs):
+    """
+        mémorise l'objet tel qu'il est enregistré en base avant sa modification
+    """
+    instance._previous = None
+    if not instance._state.adding:
+        instance._previous = sender.objects.filter(pk=instance.pk).first()
+
+
+@receiver(post_save, sender=Activity)
+@receiver(post_save, sender=Leave)
+def update_balance_on_save(sender, instance, **kwargs):
+    previous = getattr(instance, "_previous", None)
+    if previous is not None:
+        balance.shift(previous.user_id, previous.date, -balance.contribution(previous))
+    balance.shift(instance.user_id, instance.date, balance.contribution(instance))
+
+
+@receiver(post_delete, sender=Activity)
+@receiver(post_delete, sender=Leave)
+def update_balance_on_delete(sender, instance, **kwargs):
+    balance.shift(instance.user_id, instance.date, -balance.contribution(instance))
+
+
+def capacity_start(instance):
+    if isinstance(instance, CapacityPattern):
+        return instance.valid_from
+    return instance.date
+
+
+@receiver(post_save, sender=Capacity)
+@receiver(post_save, sender=CapacityPattern)
+@receiver(post_delete, sender=Capacity)
+@receiver(post_delete, sender=CapacityPattern)
+def forget_balance_on_capacity_change(sender, instance, **kwargs):
+    """
+        une capacité modifiée change le solde selon les capacités hebdomadaires ou
+        les objets « Capacity » qu'elle remplace : les points de solde suivants
+        sont oubliés
+    """
+    balance.forget(instance.user_id, capacity_start(instance))
+    previous = getattr(instance, "_previous", None)
+    if previous is not None:
+        balance.forget(previous.user_id, capacity_start(previous))
+
+
+@receiver(post_save, sender=Activity)
+def update_progression_on_save(sender, instance, **kwargs):
+    previous = getattr(instance, "_previous", None)
+    project_ids = set()
+    if instance.progression is not None:
+        project_ids.add(instance.project_id)
+    if previous is not None and previous.progression is not None:
+        project_ids.add(previous.project_id)
+    if project_ids:
+        Project.objects.filter(pk__in=project_ids).refresh_progression()
+
+
+@receiver(post_delete, sender=Activity)
+def update_progression_on_delete(sender, instance, **kwargs):
+    if instance.progression is not None:
+        Project.objects.filter(pk=instance.project_id).refresh_progression()
+
+
+@receiver(post_save, sender=Activity)
+@receiver(post_save, sender=Resource)
+def update_stats_on_save(sender, instance, **kwargs):
+    # après update_progression_on_save, dont dépend le temps nécessaire
+    project_ids = {instance.project_id}
+    previous = getattr(instance, "_previous", None)
+    if previous is not None:
+        project_ids.add(previous.project_id)
+    stats.refresh(project_ids)
+
+
+@receiver(post_delete, sender=Activity)
+@receiver(post_delete, sender=Resource)
+def update_stats_on_delete(sender, instance, **kwargs):
+    stats.refresh({instance.project_id})
+
+
+@receiver(post_save, sender=Project)
+def create_stats(sender, instance, created, **kwargs):
+    if created:
+        ProjectStats.objects.get_or_create(project=instance)
+
+
+@receiver(node_moved, sender=Project)
+def update_stats_on_move(sender, instance, **kwargs):
+    previous_ancestor_ids = instance.__dict__.pop("_previous_ancestor_ids", None)
+    if previous_ancestor_ids is not None:
+        stats.move(instance, previous_ancestor_ids)
+
+
+@receiver(post_save, sender=Activity)
+@receiver(post_save, sender=Resource)
+def invalidate_metrics_on_save(sender, instance, **kwargs):
+    project_ids = {instance.project_id}
+    previous = getattr(instance, "_previous", None)
+    if previous is not None:
+        project_ids.add(previous.project_id)
+    transaction.on_commit(lambda: metrics_cache.invalidate(project_ids))
+
+
+@receiver(post_delete, sender=Activity)
+@receiver(post_delete, sender=Resource)
+def invalidate_metrics_on_delete(sender, instance, **kwargs):
+    project_ids = {instance.project_id}
+    transaction.on_commit(lambda: metrics_cache.invalidate(project_ids))
+
+
+@receiver(post_save, sender=Project)
+@receiver(post_delete, sender=Project)
+@receiver(node_moved, sender=Project)
+def invalidate_metrics_tree(sender, instance, **kwargs):
+    transaction.on_commit(metrics_cache.invalidate_tree)
+
+
+def after_bulk_create(model, objs):
+    """
+        équivalent des signaux ci-dessus pour des objets créés par bulk_create(),
+        qui n'émet pas de signal
+    """
+    if model is not Resource:
+        first_dates = {}
+        for obj in objs:
+            if obj.user_id not in first_dates or obj.date < first_dates[obj.user_id]:
+                first_dates[obj.user_id] = obj.date
+        for user_id, date in first_dates.items():
+            balance.forget(user_id, date)
+
+    if model in (Activity, Resource):
+        project_ids = {obj.project_id for obj in objs}
+        if model is Activity:
+            Project.objects.filter(pk__in=project_ids).refresh_progression()
+        stats.refresh(project_ids)
+        transaction.on_commit(lambda: metrics_cache.invalidate(project_ids))
@@ -0,0 +1,148 @@
+import hashlib
+import json
+import time
+from datetime import date, timedelta
+from django.db.models import Count, Max
+from django.utils.dateparse import parse_date
+from accounts.models import CustomUser
+from projects.balance import get_checkpoint
+from projects.models import (
+    Activity,
+    Capacity,
+    CapacityPattern,
+    DashboardSnapshot,
+    Leave,
+    Project,
+    Resource,
+)
+from projects.planning import dashboard
+
+
+def data_version(*querysets):
+    """
+        empreinte des données : date de dernière mise à jour et nombre de lignes
+        de chaque queryset (le nombre rend compte des suppressions), comptées sur
+        updated_at pour que la lecture de son index suffise
+    """
+    parts = []
+    for queryset in querysets:
+        parts.append(
+            queryset.order_by().aggregate(
+                last=Max("updated_at"), count=Count("updated_at")
+            )
+        )
+    return parts
+
+
+def dashboard_version(user, start_date):
+    """
+        le tableau de bord dépend des absences et capacités de l'utilisateur, des
+        activités et réservations de tous (la charge restante des projets) et du
+        jour courant
+    """
+    return (
+        user.pk,
+        user.updated_at,
+        start_date,
+        data_version(
+            Activity.objects.all(),
+            Resource.objects.all(),
+            Project.objects.all(),
+            Leave.objects.filter(user=user),
+            Capacity.objects.filter(user=user),
+            CapacityPattern.objects.filter(user=user),
+        ),
+    )
+
+
+def version_hash(version):
+    return hashlib.md5(repr(version).encode()).hexdigest()
+
+
+def encode(value):
+    """
+        sérialisation JSON réversible des durées et des dates du tableau de bord
+    """
+    if isinstance(value, timedelta):
+        return {"__timedelta__": value // timedelta(microseconds=1)}
+    if isinstance(value, date):
+        return {"__date__": value.isoformat()}
+    raise TypeError(value)
+
+
+def decode(obj):
+    if len(obj) == 1 and "__timedelta__" in obj:
+        return timedelta(microseconds=obj["__timedelta__"])
+    if len(obj) == 1 and "__date__" in obj:
+        return parse_date(obj["__date__"])
+    return obj
+
+
+def fresh_snapshot(user, start_date, version):
+    return DashboardSnapshot.objects.filter(
+        user=user, start_date=start_date, version=version_hash(version)
+    ).first()
+
+
+def compute_snapshot(user, start_date, version):
+    """
+        calcule le tableau de bord : (contexte, champs de l'instantané)
+    """
+    start = time.perf_counter()
+    context = dashboard(user, start_date)
+    return (
+        context,
+        {
+            "user_id": user.pk,
+            "start_date": start_date,
+            "version": version_hash(version),
+            "data": json.dumps(context, default=encode),
+            "duration": time.perf_counter() - start,
+        },
+    )
+
+
+def save_snapshot(fields):
+    DashboardSnapshot.objects.update_or_create(
+        user_id=fields["user_id"], defaults=fields
+    )
+
+
+def cached_dashboard(user, start_date, version=None):
+    """
+        comme dashboard(), lu dans l'instantané précalculé par metrics_worker s'il
+        porte sur les données courantes, calculé et enregistré sinon ; version
+        évite de recalculer l'empreinte quand l'appelant l'a déjà
+    """
+    if version is None:
+        version = dashboard_version(user, start_date)
+    snapshot = fresh_snapshot(user, start_date, version)
+    if snapshot is not None:
+        return json.loads(snapshot.data, object_hook=decode)
+    context, fields = compute_snapshot(user, start_date, version)
+    save_snapshot(fields)
+    return context
+
+
+def prepare(users, start_date):
+    """
+        points de solde dont les tableaux de bord ont besoin, créés d'avance par
+        le processus principal de metrics_worker : les processus de calcul n'ont
+        alors plus qu'à lire la base
+    """
+    month = (start_date - timedelta(days=1)).replace(day=1)
+    for user in users:
+        get_checkpoint(user, month)
+
+
+def refresh_dashboard(user_id, start_date, force=False):
+    """
+        champs de l'instantané recalculé d'un utilisateur, None s'il était à jour
+        (sauf si force) ; exécuté par les processus de metrics_worker, le
+        processus principal enregistrant seul les instantanés
+    """
+    user = CustomUser.objects.get(pk=user_id)
+    version = dashboard_version(user, start_date)
+    if not force and fresh_snapshot(user, start_date, version) is not None:
+        return None
+    return compute_snapshot(user, start_date, version)[1]
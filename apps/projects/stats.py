@@ -0,0 +1,154 @@
+from django.db import transaction
+from projects.models import Project, ProjectStats
+from projects.rollup import rollup_projects
+
+NODE_FIELDS = ("spent", "allotted", "remaining_allotted", "remaining_needed", "margin")
+TOTAL_FIELDS = tuple("total_" + field for field in NODE_FIELDS)
+
+
+def node_figures(project):
+    """
+        valeurs propres au projet
+    """
+    return {
+        "spent": project.duration,
+        "allotted": project.allotted_time,
+        "remaining_allotted": project.remaining_time_allotted,
+        "remaining_needed": project.remaining_time_needed,
+        "margin": project.margin,
+    }
+
+
+def expected_figures(project):
+    """
+        toutes les colonnes de ProjectStats, pour un projet issu de rollup_projects()
+    """
+    figures = node_figures(project)
+    figures.update(
+        {
+            "total_spent": project.total,
+            "total_allotted": project.total_allotted_time,
+            "total_remaining_allotted": project.total_remaining_time_allotted,
+            "total_remaining_needed": project.total_remaining_time_needed,
+            "total_margin": project.total_margin,
+        }
+    )
+    return figures
+
+
+def add_to_totals(stats, figures, sign=1):
+    for field in NODE_FIELDS:
+        total_field = "total_" + field
+        setattr(stats, total_field, getattr(stats, total_field) + sign * figures[field])
+
+
+def rebuild(queryset=None):
+    """
+        recalcule entièrement les statistiques des projets du queryset (sous-arbres
+        complets, tout l'arbre par défaut)
+    """
+    if queryset is None:
+        queryset = Project.objects.all()
+    projects = rollup_projects(queryset)
+    existing = {
+        stats.project_id: stats
+        for stats in ProjectStats.objects.filter(project__in=queryset.values("pk"))
+    }
+
+    created, updated = [], []
+    for project in projects:
+        stats = existing.get(project.pk)
+        if stats is None:
+            stats = ProjectStats(project=project)
+            created.append(stats)
+        else:
+            updated.append(stats)
+        for field, value in expected_figures(project).items():
+            setattr(stats, field, value)
+
+    with transaction.atomic():
+        ProjectStats.objects.bulk_create(created)
+        ProjectStats.objects.bulk_update(updated, NODE_FIELDS + TOTAL_FIELDS)
+
+
+def refresh(project_ids):
+    """
+        recalcule les valeurs propres des projets et reporte les écarts sur les
+        cumuls du projet et de ses ancêtres
+    """
+    with transaction.atomic():
+        for project in Project.objects.filter(pk__in=project_ids).with_time_stats():
+            rows = list(
+                ProjectStats.objects.select_for_update().filter(
+                    project__in=project.get_ancestors(include_self=True)
+                )
+            )
+            if len(rows) != project.level + 1:
+                # statistiques incomplètes (jamais calculées) : tout l'arbre est repris
+                rebuild(Project.objects.filter(tree_id=project.tree_id))
+                continue
+
+            stats = next(row for row in rows if row.project_id == project.pk)
+            figures = node_figures(project)
+            delta = {
+                field: figures[field] - getattr(stats, field) for field in NODE_FIELDS
+            }
+            if not any(delta.values()):
+                continue
+
+            for field in NODE_FIELDS:
+                setattr(stats, field, figures[field])
+            for row in rows:
+                add_to_totals(row, delta)
+            ProjectStats.objects.bulk_update(rows, NODE_FIELDS + TOTAL_FIELDS)
+
+
+def move(project, previous_ancestor_ids):
+    """
+        reporte le déplacement d'un sous-arbre : ses cumuls sont retirés de ses
+        anciens ancêtres et ajoutés aux nouveaux
+    """
+    ancestor_ids = set(project.get_ancestors().values_list("pk", flat=True))
+    removed = set(previous_ancestor_ids) - ancestor_ids
+    added = ancestor_ids - set(previous_ancestor_ids)
+    if not removed and not added:
+        return
+
+    with transaction.atomic():
+        rows = list(
+            ProjectStats.objects.select_for_update().filter(
+                project__in=removed | added | {project.pk}
+            )
+        )
+        if len(rows) != len(removed) + len(added) + 1:
+            rebuild()
+            return
+
+        stats = next(row for row in rows if row.project_id == project.pk)
+        figures = {field: getattr(stats, "total_" + field) for field in NODE_FIELDS}
+        rows.remove(stats)
+        for row in rows:
+            add_to_totals(row, figures, -1 if row.project_id in removed else 1)
+        ProjectStats.objects.bulk_update(rows, TOTAL_FIELDS)
+
+
+def differences(queryset=None):
+    """
+        écarts entre la table ProjectStats et le calcul direct :
+        [(projet, colonne, valeur enregistrée, valeur attendue)]
+    """
+    if queryset is None:
+        queryset = Project.objects.all()
+    projects = rollup_projects(queryset)
+    stored = {
+        stats.project_id: stats
+        for stats in ProjectStats.objects.filter(project__in=queryset.values("pk"))
+    }
+    errors = []
+    for project in projects:
+        stats = stored.get(project.pk)
+        for field, value in expected_figures(project).items():
+            stored_value = getattr(stats, field) if stats is not None else None
+            if stored_value != value:
+                errors.append((project, field, stored_value, value))
+    return errors
@@ -0,0 +1,235 @@
+import random
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import Max
+from simple_history.utils import bulk_create_with_history
+from accounts.models import CustomUser
+from projects import stats
+from projects.models import (
+    DAILY_WORKING_TIME,
+    Activity,
+    Capacity,
+    Leave,
+    Location,
+    Project,
+    Resource,
+)
+from projects.signals import after_bulk_create
+
+CHUNK_SIZE = 1000
+LEAVE_TYPES = [Leave.CONGES] * 6 + [Leave.RECUP, Leave.FERIE, Leave.MALADIE]
+
+
+class Organisation:
+    """
+        organisation synthétique : utilisateurs, arbre de projets et relevés
+        quotidiens sur une période de years années se terminant le jour until
+
+        Les données ne dépendent que des paramètres, graine comprise : deux
+        organisations construites avec les mêmes paramètres sont identiques (aux
+        identifiants près).
+    """
+
+    def __init__(
+        self,
+        until,
+        users=20,
+        depth=3,
+        fanout=4,
+        activities=400,
+        years=1,
+        horizon=90,
+        seed=0,
+        prefix="bench",
+    ):
+        self.until = until
+        self.user_number = users
+        self.depth = depth
+        self.fanout = fanout
+        self.activities = activities
+        self.years = years
+        self.horizon = horizon
+        self.prefix = prefix
+        self.random = random.Random(seed)
+
+        self.start = until - timedelta(days=365 * years)
+        self.created = {}
+
+    def days(self, start, end):
+        """
+            jours ouvrés de start à end exclu
+        """
+        day = start
+        while day < end:
+            if day.weekday() < 5:
+                yield day
+            day += timedelta(days=1)
+
+    def save(self, model, objs):
+        """
+            enregistre les objets par paquets, historique compris, en tenant à jour
+            les données dérivées comme le fait l'import
+        """
+        chunk = []
+        for obj in objs:
+            chunk.append(obj)
+            if len(chunk) >= CHUNK_SIZE:
+                self.save_chunk(model, chunk)
+                chunk = []
+        if chunk:
+            self.save_chunk(model, chunk)
+
+    def save_chunk(self, model, chunk):
+        with transaction.atomic():
+            bulk_create_with_history(chunk, model)
+            if model in (Activity, Capacity, Leave, Resource):
+                after_bulk_create(model, chunk)
+        self.created[model.__name__] = self.created.get(model.__name__, 0) + len(chunk)
+
+    def build_users(self):
+        self.users = [
+            CustomUser(
+                username="{}-{:04d}".format(self.prefix, i),
+                email="{}-{:04d}@example.com".format(self.prefix, i),
+            )
+            for i in range(self.user_number)
+        ]
+        for user in self.users:
+            user.set_unusable_password()
+        CustomUser.objects.bulk_create(self.users)
+        self.created["CustomUser"] = len(self.users)
+
+    def build_projects(self):
+        """
+            arbre complet de profondeur depth et d'arité fanout, dont les bornes
+            lft/rght sont calculées ici pour tout enregistrer en une fois
+        """
+        projects = []
+        self.leaves = []
+        last_tree_id = Project.objects.aggregate(last=Max("tree_id"))["last"] or 0
+
+        def build(parent, tree_id, level, lft, path):
+            project = Project(
+                title="{} {}".format(self.prefix, path),
+                parent=parent,
+                tree_id=tree_id,
+                level=level,
+                lft=lft,
+            )
+            projects.append(project)
+            rght = lft + 1
+            if level + 1 < self.depth:
+                for i in range(self.fanout):
+                    child_path = "{}.{}".format(path, i + 1)
+                    rght = build(project, tree_id, level + 1, rght, child_path) + 1
+            else:
+                self.leaves.append(project)
+            project.rght = rght
+            return rght
+
+        tree_ids = [last_tree_id + i + 1 for i in range(self.fanout)]
+        for i, tree_id in enumerate(tree_ids):
+            build(None, tree_id, 0, 1, str(i + 1))
+        self.save(Project, projects)
+        # créés sans signal : les statistiques sont calculées d'un coup
+        stats.rebuild(Project.objects.filter(tree_id__in=tree_ids))
+        self.projects = projects
+
+    def build_locations(self):
+        self.locations = list(Location.objects.all()[:3])
+        if not self.locations:
+            self.locations = [
+                Location(title=title) for title in ("bureau", "domicile", "client")
+            ]
+            self.save(Location, self.locations)
+
+    def build_resources(self):
+        """
+            chaque utilisateur est affecté à quelques projets terminaux (temps
+            alloué sans date) et réserve du temps presque chaque jour ouvré de
+            l'horizon de planification
+        """
+        self.assignments = {}
+        resources = []
+        for user in self.users:
+            projects = self.random.sample(self.leaves, min(5, len(self.leaves)))
+            self.assignments[user.pk] = projects
+            for project in projects:
+                resources.append(
+                    Resource(
+                        user=user,
+                        project=project,
+                        duration=timedelta(hours=self.random.randint(20, 400)),
+                    )
+                )
+            for day in self.days(self.until, self.until + timedelta(days=self.horizon)):
+                if self.random.random() < 0.6:
+                    resources.append(
+                        Resource(
+                            user=user,
+                            project=self.random.choice(projects),
+                            date=day,
+                            duration=timedelta(hours=self.random.randint(1, 4)),
+                        )
+                    )
+        self.save(Resource, resources)
+
+    def build_capacities(self):
+        end = self.until + timedelta(days=self.horizon)
+        self.save(
+            Capacity,
+            (
+                Capacity(user=user, date=day, duration=DAILY_WORKING_TIME)
+                for user in self.users
+                for day in self.days(self.start, end)
+            ),
+        )
+
+    def build_leaves(self):
+        leaves = []
+        for user in self.users:
+            for day in self.days(self.start, self.until):
+                if self.random.random() < 0.1:
+                    leaves.append(
+                        Leave(user=user, date=day, type=self.random.choice(LEAVE_TYPES))
+                    )
+        self.save(Leave, leaves)
+
+    def build_activities(self):
+        period = (self.until - self.start).days
+        activities = []
+        for user in self.users:
+            projects = self.assignments[user.pk]
+            for i in range(self.activities * self.years):
+                location = self.random.choice(self.locations)
+                activities.append(
+                    Activity(
+                        user=user,
+                        project=self.random.choice(projects),
+                        location=location,
+                        date=self.start + timedelta(days=self.random.randrange(period)),
+                        duration=timedelta(minutes=30 * self.random.randint(1, 16)),
+                        progression=(
+                            self.random.randint(0, 100)
+                            if self.random.random() < 0.2
+                            else None
+                        ),
+                        is_teleworking=location.title == "domicile",
+                        is_business_trip=location.title == "client",
+                    )
+                )
+        self.save(Activity, activities)
+
+    def build(self):
+        """
+            construit toute l'organisation ; renvoie le nombre d'objets créés par
+            modèle
+        """
+        self.build_users()
+        self.build_projects()
+        self.build_locations()
+        self.build_resources()
+        self.build_capacities()
+        self.build_leaves()
+        self.build_activities()
+        return self.created
@@ -1,3 +1,366 @@
+import random
+from datetime import date, timedelta
+from importlib import import_module
+from django.apps import apps
 from django.test import TestCase
+from accounts.models import CustomUser
+from projects import balance, stats
+from projects.models import (
+    Activity,
+    BalanceCheckpoint,
+    Capacity,
+    CapacityPattern,
+    Leave,
+    Location,
+    Project,
+    ProjectStats,
+    Resource,
+)
 
-# Create your tests here.
+
+def create_user(username):
+    return CustomUser.objects.create_user(
+        username, "{}@example.com".format(username), "password"
+    )
+
+
+class ProjectStatsTests(TestCase):
+    """
+        la table ProjectStats tenue à jour par les signaux (stats.refresh,
+        stats.move) reste égale au calcul direct (stats.differences)
+    """
+
+    def setUp(self):
+        self.user = create_user("alice")
+        self.other = create_user("bob")
+        self.location = Location.objects.create(title="bureau")
+        self.root = Project.objects.create(title="racine")
+        self.a = Project.objects.create(title="a", parent=self.root)
+        self.b = Project.objects.create(title="b", parent=self.root)
+        self.a1 = Project.objects.create(title="a1", parent=self.a)
+        self.a2 = Project.objects.create(title="a2", parent=self.a)
+        self.other_root = Project.objects.create(title="autre racine")
+        for project, hours in ((self.a1, 20), (self.a2, 8), (self.b, 12)):
+            Resource.objects.create(
+                user=self.user, project=project, duration=timedelta(hours=hours)
+            )
+
+    def add_activity(self, project, hours, progression=None, day=1, user=None):
+        return Activity.objects.create(
+            user=user or self.user,
+            project=project,
+            date=date(2020, 3, day),
+            duration=timedelta(hours=hours),
+            progression=progression,
+            location=self.location,
+        )
+
+    def reload(self, project):
+        return Project.objects.get(pk=project.pk)
+
+    def assertStatsConsistent(self):
+        self.assertEqual(ProjectStats.objects.count(), Project.objects.count())
+        self.assertEqual(stats.differences(), [])
+
+    def test_activity_edits(self):
+        activity = self.add_activity(self.a1, 3, progression=20)
+        self.add_activity(self.a2, 2.5)
+        self.add_activity(self.b, 4, progression=50, user=self.other)
+        self.assertStatsConsistent()
+
+        activity.duration = timedelta(hours=7, minutes=30)
+        activity.save()
+        self.assertStatsConsistent()
+
+        # l'activité change de projet : l'ancien et le nouveau sont repris
+        activity.project = self.b
+        activity.progression = 80
+        activity.save()
+        self.assertStatsConsistent()
+
+        activity.delete()
+        self.assertStatsConsistent()
+
+    def test_progression_changes_remaining_time(self):
+        self.add_activity(self.a1, 10, progression=25, day=1)
+        later = self.add_activity(self.a1, 5, progression=50, day=2)
+        self.assertStatsConsistent()
+        self.assertEqual(
+            ProjectStats.objects.get(project=self.a1).remaining_needed,
+            timedelta(hours=15),
+        )
+
+        # la dernière progression disparaît : la précédente s'applique à nouveau
+        later.delete()
+        self.assertStatsConsistent()
+
+    def test_resource_edits(self):
+        self.add_activity(self.a2, 6, progression=40)
+        resource = Resource.objects.create(
+            user=self.other, project=self.a2, duration=timedelta(hours=4)
+        )
+        self.assertStatsConsistent()
+
+        resource.duration = timedelta(hours=9)
+        resource.project = self.b
+        resource.save()
+        self.assertStatsConsistent()
+
+        resource.delete()
+        self.assertStatsConsistent()
+
+    def test_move_node(self):
+        self.add_activity(self.a1, 3, progression=30)
+        self.add_activity(self.a, 2)
+        self.add_activity(self.b, 5, progression=10)
+
+        # déplacement sous un autre parent, par move_to()
+        self.reload(self.a1).move_to(self.reload(self.b))
+        self.assertStatsConsistent()
+
+        # sous-arbre déplacé vers un autre arbre, par changement du parent
+        a = self.reload(self.a)
+        a.parent = self.reload(self.other_root)
+        a.save()
+        self.assertStatsConsistent()
+
+        # le sous-arbre devient un arbre à part entière
+        a = self.reload(self.a)
+        a.parent = None
+        a.save()
+        self.assertStatsConsistent()
+
+    def test_missing_rows_are_rebuilt(self):
+        self.add_activity(self.a1, 3, progression=30)
+        ProjectStats.objects.filter(project=self.a).delete()
+
+        self.add_activity(self.a1, 2)
+        self.assertStatsConsistent()
+
+    def test_backfill_migration(self):
+        self.add_activity(self.a1, 3, progression=30)
+        self.add_activity(self.b, 4, progression=100)
+        ProjectStats.objects.filter(project__in=[self.root, self.a1]).delete()
+        ProjectStats.objects.update(total_spent=timedelta(hours=1))
+
+        migration = import_module("projects.migrations.0013_backfill_projectstats")
+        migration.backfill_project_stats(apps, None)
+        self.assertStatsConsistent()
+
+
+class BalanceCheckpointTests(TestCase):
+    """
+        les points de solde tenus à jour par les signaux (balance.shift,
+        balance.forget) restent égaux au recalcul depuis le début
+        (balance.compute_checkpoints, utilisé par rebuild_balances)
+    """
+
+    UNTIL = date(2020, 12, 31)
+
+    def setUp(self):
+        self.user = create_user("alice")
+        self.other = create_user("bob")
+        self.users = [self.user, self.other]
+        self.location = Location.objects.create(title="bureau")
+        self.project = Project.objects.create(title="projet")
+        for user in self.users:
+            CapacityPattern.objects.create(user=user, valid_from=date(2020, 1, 1))
+            for month in range(1, 13):
+                self.add_activity(date(2020, month, 6), 7, user=user)
+                self.add_activity(date(2020, month, 20), 9.5, user=user)
+            Capacity.objects.create(
+                user=user, date=date(2020, 3, 2), duration=timedelta(hours=4)
+            )
+            Leave.objects.create(user=user, date=date(2020, 7, 15))
+            Leave.objects.create(user=user, date=date(2020, 8, 3), type=Leave.RECUP)
+        self.materialize()
+
+    def add_activity(self, day, hours, user=None):
+        return Activity.objects.create(
+            user=user or self.user,
+            project=self.project,
+            date=day,
+            duration=timedelta(hours=hours),
+            location=self.location,
+        )
+
+    def materialize(self):
+        """
+            crée les points de solde de tous les mois de l'année
+        """
+        for user in self.users:
+            for month in range(1, 13):
+                balance.get_balance(user, date(2020, month, 15))
+
+    def checkpoint_months(self, user):
+        return list(
+            BalanceCheckpoint.objects.filter(user=user)
+            .order_by("month")
+            .values_list("month", flat=True)
+        )
+
+    def assertCheckpointsConsistent(self):
+        expected = balance.compute_checkpoints(self.users, self.UNTIL)
+        for checkpoint in BalanceCheckpoint.objects.all():
+            self.assertEqual(
+                checkpoint.balance,
+                expected.get((checkpoint.user_id, checkpoint.month), timedelta()),
+                "{} au {}".format(checkpoint.user_id, checkpoint.month),
+            )
+        for user in self.users:
+            for day in (date(2020, 2, 29), date(2020, 7, 15), date(2020, 12, 31)):
+                self.assertEqual(
+                    balance.get_balance(user, day),
+                    balance.period_balance(user, None, day + timedelta(days=1)),
+                )
+
+    def assertShifted(self, check):
+        """
+            la modification, faite par check(), n'a supprimé aucun point de solde
+        """
+        months = {user.pk: self.checkpoint_months(user) for user in self.users}
+        check()
+        for user in self.users:
+            self.assertEqual(self.checkpoint_months(user), months[user.pk])
+        self.assertCheckpointsConsistent()
+
+    def test_initial_checkpoints(self):
+        self.assertEqual(len(self.checkpoint_months(self.user)), 12)
+        self.assertCheckpointsConsistent()
+
+    def test_back_dated_activity(self):
+        self.assertShifted(lambda: self.add_activity(date(2020, 2, 10), 3))
+
+    def test_activity_date_and_duration_change(self):
+        activity = Activity.objects.get(user=self.user, date=date(2020, 11, 20))
+
+        def check():
+            activity.date = date(2020, 3, 31)
+            activity.duration = timedelta(hours=2, minutes=15)
+            activity.save()
+
+        self.assertShifted(check)
+
+    def test_activity_user_change(self):
+        activity = Activity.objects.get(user=self.user, date=date(2020, 4, 6))
+
+        def check():
+            activity.user = self.other
+            activity.save()
+
+        self.assertShifted(check)
+
+    def test_leave_type_change(self):
+        leave = Leave.objects.get(user=self.user, date=date(2020, 7, 15))
+        for leave_type in (Leave.RECUP, Leave.MALADIE, Leave.RECUP, Leave.CONGES):
+
+            def check():
+                leave.type = leave_type
+                leave.save()
+
+            self.assertShifted(check)
+
+    def test_leave_user_and_date_change(self):
+        leave = Leave.objects.get(user=self.user, date=date(2020, 8, 3))
+
+        def check():
+            leave.user = self.other
+            leave.date = date(2020, 1, 31)
+            leave.type = Leave.CONGES
+            leave.save()
+
+        self.assertShifted(check)
+
+    def test_deletes(self):
+        self.assertShifted(
+            lambda: Activity.objects.get(
+                user=self.user, date=date(2020, 5, 20)
+            ).delete()
+        )
+        self.assertShifted(
+            lambda: Leave.objects.get(user=self.other, date=date(2020, 7, 15)).delete()
+        )
+
+    def test_capacity_forget(self):
+        capacity = Capacity.objects.create(
+            user=self.user, date=date(2020, 6, 10), duration=timedelta(hours=2)
+        )
+        # les points de solde suivants sont oubliés, les précédents gardés
+        self.assertEqual(
+            self.checkpoint_months(self.user), [date(2020, m, 1) for m in range(1, 7)]
+        )
+        self.assertEqual(len(self.checkpoint_months(self.other)), 12)
+        self.assertCheckpointsConsistent()
+
+        self.materialize()
+        capacity.date = date(2020, 4, 2)
+        capacity.user = self.other
+        capacity.save()
+        self.assertEqual(len(self.checkpoint_months(self.user)), 6)
+        self.assertEqual(len(self.checkpoint_months(self.other)), 4)
+        self.assertCheckpointsConsistent()
+
+        self.materialize()
+        Capacity.objects.get(pk=capacity.pk).delete()
+        self.assertEqual(len(self.checkpoint_months(self.other)), 4)
+        self.assertCheckpointsConsistent()
+
+    def test_capacity_pattern_forget(self):
+        pattern = CapacityPattern.objects.create(
+            user=self.user, valid_from=date(2020, 9, 1), friday=timedelta()
+        )
+        self.assertEqual(len(self.checkpoint_months(self.user)), 9)
+        self.assertCheckpointsConsistent()
+
+        self.materialize()
+        pattern.valid_from = date(2020, 5, 1)
+        pattern.save()
+        self.assertEqual(len(self.checkpoint_months(self.user)), 5)
+        self.assertCheckpointsConsistent()
+
+        # repoussée, elle cesse de s'appliquer dès son ancien début
+        self.materialize()
+        pattern.valid_from = date(2020, 10, 1)
+        pattern.save()
+        self.assertEqual(len(self.checkpoint_months(self.user)), 5)
+        self.assertCheckpointsConsistent()
+
+        self.materialize()
+        CapacityPattern.objects.get(pk=pattern.pk).delete()
+        self.assertEqual(len(self.checkpoint_months(self.user)), 10)
+        self.assertCheckpointsConsistent()
+
+    def test_random_edits(self):
+        rng = random.Random(0)
+
+        def random_day():
+            return date(2020, 1, 1) + timedelta(days=rng.randrange(366))
+
+        for i in range(60):
+            user = rng.choice(self.users)
+            model = rng.choice([Activity, Leave])
+            existing = list(model.objects.filter(user=user))
+            action = rng.choice(["create", "update", "delete"])
+            if action == "create" or not existing:
+                if model is Activity:
+                    self.add_activity(random_day(), rng.randint(1, 10), user=user)
+                else:
+                    Leave.objects.create(
+                        user=user,
+                        date=random_day(),
+                        type=rng.choice([Leave.CONGES, Leave.RECUP, Leave.MALADIE]),
+                    )
+            elif action == "update":
+                instance = rng.choice(existing)
+                instance.user = rng.choice(self.users)
+                instance.date = random_day()
+                instance.duration = timedelta(minutes=rng.randrange(30, 600, 15))
+                if model is Leave:
+                    instance.type = rng.choice([Leave.CONGES, Leave.RECUP])
+                instance.save()
+            else:
+                rng.choice(existing).delete()
+            if i % 20 == 19:
+                self.materialize()
+        self.assertEqual(len(self.checkpoint_months(self.user)), 12)
+        self.assertCheckpointsConsistent()
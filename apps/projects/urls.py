@@ -1,12 +1,18 @@
 from django.urls import path
 
+from projects import api
 from projects.views import (
     ActivityListView,
+    ExportView,
     LeaveListView,
     ProjectListView,
     ProjectListByUserView,
     ProjectDetailView,
+    PresenceReportView,
     ProjectDetailByUserView,
+    ReportView,
+    TeamHeatmapView,
+    TeamPlanningView,
 )
 
 app_name = "projects"
@@ -24,5 +30,29 @@ urlpatterns = [
         ProjectDetailByUserView.as_view(),
         name="project_detail_by_user",
     ),
+    path("planning", TeamPlanningView.as_view(), name="team_planning"),
+    path("planning/heatmap", TeamHeatmapView.as_view(), name="team_heatmap"),
+    path(
+        "planning/heatmap.<str:fmt>",
+        TeamHeatmapView.as_view(),
+        name="team_heatmap_export",
+    ),
+    path("reports/pivot", ReportView.as_view(), name="report"),
+    path("reports/pivot.<str:fmt>", ReportView.as_view(), name="report_export"),
+    path("reports/presence", PresenceReportView.as_view(), name="presence_report"),
+    path(
+        "reports/presence.<str:fmt>",
+        PresenceReportView.as_view(),
+        name="presence_report_export",
+    ),
     path("absences", LeaveListView.as_view(), name="leave_list"),
+    path("exports/<str:kind>.csv", ExportView.as_view(), name="export"),
+    path("api/dashboard", api.DashboardView.as_view(), name="api_dashboard"),
+    path("api/planning", api.PlanningView.as_view(), name="api_planning"),
+    path("api/projects", api.ProjectListView.as_view(), name="api_project_list"),
+    path(
+        "api/projects/<uuid:pk>/",
+        api.ProjectDetailView.as_view(),
+        name="api_project_detail",
+    ),
 ]
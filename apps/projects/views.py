@@ -1,10 +1,69 @@
-from django.utils import timezone
+import csv
+import uuid
 from datetime import timedelta
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.db.models import Q
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.generic import TemplateView, View
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.generic.list import ListView
-from django.shortcuts import get_object_or_404
+from django.shortcuts import get_object_or_404, render
+from django.utils.html import format_html
+from django.utils.safestring import mark_safe
 from accounts.models import CustomUser
-from projects.models import Activity, Capacity, Leave, Project, Resource
+from projects.exports import EXPORTS, csv_lines, export_queryset, format_hours, hours
+from projects.fragments import activity_weeks
+from projects.models import Activity, Leave, Project
+from projects.planning import TeamForecast, team_heatmap
+from projects.reports import PERIODS, PivotReport, PresenceReport
+from projects.metrics_cache import cached_rollup
+from projects.rollup import rollup_user_projects
+from projects.snapshots import cached_dashboard
+
+
+def date_parameter(request, name):
+    """
+        date passée en paramètre GET (AAAA-MM-JJ), None si elle est absente
+    """
+    if not request.GET.get(name):
+        return None
+    try:
+        date = parse_date(request.GET[name])
+    except ValueError:
+        date = None
+    if date is None:
+        raise Http404("Date invalide.")
+    return date
+
+
+def user_parameter(request):
+    """
+        utilisateur passé en paramètre GET user : tous (None) par défaut pour un
+        superutilisateur, seulement lui-même pour un autre utilisateur
+    """
+    username = request.GET.get("user")
+    if request.user.is_superuser:
+        if username:
+            return get_object_or_404(CustomUser, username=username)
+        return None
+    if username and username != request.user.username:
+        raise PermissionDenied
+    return request.user
+
+
+def project_parameter(request):
+    """
+        projet passé en paramètre GET project (id), None s'il est absent
+    """
+    if not request.GET.get("project"):
+        return None
+    try:
+        project_id = uuid.UUID(request.GET["project"])
+    except ValueError:
+        raise Http404("Projet invalide.")
+    return get_object_or_404(Project, id=project_id)
 
 
 class ProjectListView(LoginRequiredMixin, ListView):
@@ -12,6 +71,9 @@ class ProjectListView(LoginRequiredMixin, ListView):
     model = Project
     template_name = "projects/project_list.html"
 
+    def get_queryset(self):
+        return cached_rollup(Project.objects.root_nodes())
+
 
 class ProjectListByUserView(LoginRequiredMixin, ListView):
 
@@ -19,16 +81,12 @@ class ProjectListByUserView(LoginRequiredMixin, ListView):
     template_name = "projects/project_list_by_user.html"
 
     def get_queryset(self):
-        user = get_object_or_404(CustomUser, username=self.kwargs["username"])
-        queryset = Project.objects.filter(activity__user=user).distinct()
-        for project in queryset:
-            project.duration_user = project.duration_by_user(user)
-        return queryset
+        self.user = get_object_or_404(CustomUser, username=self.kwargs["username"])
+        return rollup_user_projects(self.user)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        user = get_object_or_404(CustomUser, username=self.kwargs["username"])
-        context["current_user"] = user
+        context["current_user"] = self.user
         return context
 
 
@@ -38,10 +96,8 @@ class ProjectDetailView(LoginRequiredMixin, ListView):
     template_name = "projects/project_detail.html"
 
     def get_queryset(self):
-        queryset = get_object_or_404(Project, id=self.kwargs["pk"]).get_descendants(
-            include_self=True
-        )
-        return queryset
+        project = get_object_or_404(Project, id=self.kwargs["pk"])
+        return cached_rollup([project])
 
 
 class ProjectDetailByUserView(LoginRequiredMixin, ListView):
@@ -50,17 +106,17 @@ class ProjectDetailByUserView(LoginRequiredMixin, ListView):
     template_name = "projects/project_detail_by_user.html"
 
     def get_queryset(self):
-        project = get_object_or_404(Project, id=self.kwargs["pk"])
-        user = get_object_or_404(CustomUser, username=self.kwargs["username"])
-        queryset = Activity.objects.filter(project=project, user=user)
+        self.project = get_object_or_404(Project, id=self.kwargs["pk"])
+        self.user = get_object_or_404(CustomUser, username=self.kwargs["username"])
+        queryset = Activity.objects.filter(
+            project=self.project, user=self.user
+        ).select_related("project", "location")
         return queryset
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        user = get_object_or_404(CustomUser, username=self.kwargs["username"])
-        context["current_user"] = user
-        project = get_object_or_404(Project, id=self.kwargs["pk"])
-        context["project"] = project
+        context["current_user"] = self.user
+        context["project"] = self.project
         return context
 
 
@@ -68,135 +124,292 @@ class ActivityListView(LoginRequiredMixin, ListView):
 
     model = Activity
     paginate_by = 50
+    cursor_kwarg = "after"
+    next_cursor = None
 
     def get_queryset(self):
-        queryset = Activity.objects.filter(user=self.request.user)
-        for activity in queryset:
-            activity.week = activity.date.isocalendar()[1]
+        queryset = (
+            Activity.objects.filter(user=self.request.user)
+            .select_related("project", "location")
+            .order_by("-date", "-id")
+        )
         return queryset
 
+    def paginate_queryset(self, queryset, page_size):
+        """
+            pagination par curseur (date et id de la dernière activité affichée,
+            paramètre « after ») : un simple parcours d'index à partir de
+            l'activité la plus récente ou du curseur, sans décompte de toutes les
+            activités
+        """
+        cursor = self.request.GET.get(self.cursor_kwarg)
+        if cursor is not None:
+            try:
+                date, pk = cursor.split("_")
+                date, pk = parse_date(date), uuid.UUID(pk)
+            except (TypeError, ValueError):
+                raise Http404("Curseur invalide.")
+            if date is None:
+                raise Http404("Curseur invalide.")
+            queryset = queryset.filter(Q(date__lt=date) | Q(date=date, id__lt=pk))
+
+        object_list = list(queryset[: page_size + 1])
+        if len(object_list) > page_size:
+            object_list = object_list[:page_size]
+            self.next_cursor = self.get_cursor(object_list[-1])
+        return None, None, object_list, False
+
+    def get_cursor(self, activity):
+        return "{}_{}".format(activity.date.isoformat(), activity.id)
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        context["next_cursor"] = self.next_cursor
+        context["week_fragments"] = activity_weeks(
+            self.request.user, context["object_list"]
+        )
+
+        context.update(
+            cached_dashboard(self.request.user, timezone.now().today().date())
+        )
 
-        user = self.request.user
+        return context
+
+
+class TeamPlanningView(LoginRequiredMixin, TemplateView):
+    """
+        prévision de charge de toute l'équipe : prochaine disponibilité de chaque
+        utilisateur et date d'achèvement projetée de chaque projet ; paramètre GET
+        end (AAAA-MM-JJ) pour fixer l'horizon
+    """
+
+    template_name = "projects/team_planning.html"
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
         start_date = timezone.now().today().date()
-        try:
-            end_date = Capacity.objects.filter(user=user).order_by("-date")[0].date
-        except:
-            end_date = start_date
-        delta = end_date - start_date
-
-        next_available_date = start_date
-
-        # absences ?
-
-        # temps de travail estimé
-        total_load = timedelta()
-
-        projects = {}
-        for project in Project.objects.filter(resource__user=user).distinct():
-            # qui ?
-            # users = CustomUser.objects.filter(resource__project=project).distinct()
-
-            # combien de temps alloué sur le projet ?
-            t_user = timedelta()
-            for resource in Resource.objects.filter(project=project, user=user):
-                t_user += resource.duration
-                if resource.date:
-                    total_load -= resource.duration
-
-            # quel rapport ?
-            t_total = project.allotted_time
-            if t_total == 0:
-                r = 1
-            else:
-                r = t_user / t_total
-
-            load = r * project.remaining_time_needed
-            total_load += load
-            projects[project.title] = load
-
-        context["total_load"] = total_load
-
-        date_list = []
-        capacity_list = []
-        booked_list = []
-        available_list = []
-        leave_list = []
-        day_number = delta.days + 1
-        for i in range(day_number):
-            date = start_date + timedelta(days=i)
-
-            # temps disponible
-            capacity = timedelta()
-            capacities = Capacity.objects.filter(user=user, date=date)
-            for c in capacities:
-                capacity += c.duration
-
-            # temps déjà attribué
-            booked = timedelta()
-            resources = Resource.objects.filter(user=user, date=date)
-            for resource in resources:
-                booked += resource.duration
-
-            # y-a-t-il des congés ?
-            leave = timedelta()
-            leaves = Leave.objects.filter(user=user, date=date)
-            for l in leaves:
-                leave += l.duration
-
-            # atribution du temps
-            available = capacity - booked - leave
-
-            if available > timedelta() and total_load > timedelta():
-                if (total_load - available) > timedelta():
-                    total_load -= available
-                    available = timedelta()
-                else:
-                    available -= total_load
-                    total_load = timedelta()
-                    next_available_date = date
-
-            date_list.append(date)
-            capacity_list.append(capacity)
-            booked_list.append(booked)
-            leave_list.append(leave)
-            available_list.append(available)
+        end_date = date_parameter(self.request, "end")
 
+        forecast = TeamForecast(start_date, end_date=end_date).run()
         context["start_date"] = start_date
-        context["end_date"] = end_date
-        context["delta"] = day_number
-        context["date_list"] = date_list
-        context["capacity_list"] = capacity_list
-        context["booked_list"] = booked_list
-        context["leave_list"] = leave_list
-        context["available_list"] = available_list
-        context["project_list"] = projects
-        context["next_available_date"] = next_available_date
-
-        # calcul du solde d'heures
-        the_day_before = start_date - timedelta(days=1)
-
-        work_capacity_time = timedelta()
-        for capacity in Capacity.objects.filter(user=user, date__lte=the_day_before):
-            work_capacity_time += capacity.duration
-
-        work_activity_time = timedelta()
-        for activity in Activity.objects.filter(user=user, date__lte=the_day_before):
-            work_activity_time += activity.duration
-
-        leave_time = timedelta()
-        for leave in Leave.objects.filter(user=user, date__lte=the_day_before).exclude(
-            type=Leave.RECUP
-        ):
-            leave_time += leave.duration
-
-        context["balance"] = (
-            user.start_balance + work_activity_time + leave_time - work_capacity_time
+        context["user_forecasts"] = forecast.user_forecasts
+        context["project_forecasts"] = forecast.project_forecasts
+        return context
+
+
+class TeamHeatmapView(LoginRequiredMixin, View):
+    """
+        grille utilisateurs × jours de la capacité, des absences, du temps réservé
+        et du temps libre de l'équipe, en HTML, CSV ou JSON ; paramètres GET start
+        et end (AAAA-MM-JJ, inclus), les 90 prochains jours par défaut
+    """
+
+    formats = ("html", "csv", "json")
+    default_days = 90
+    max_days = 366
+
+    def get(self, request, fmt="html"):
+        if fmt not in self.formats:
+            raise Http404("Format inconnu.")
+
+        start_date = date_parameter(request, "start") or timezone.now().today().date()
+        end_date = date_parameter(request, "end") or start_date + timedelta(
+            days=self.default_days - 1
+        )
+        if not 0 <= (end_date - start_date).days < self.max_days:
+            raise Http404("Période invalide.")
+
+        dates, rows = team_heatmap(start_date, end_date)
+        return getattr(self, "render_" + fmt)(request, dates, rows)
+
+    def render_html(self, request, dates, rows):
+        # 50 utilisateurs sur 180 jours font 9 000 cases : elles sont formatées
+        # ici plutôt que dans une boucle du gabarit
+        for row in rows:
+            row["cells"] = mark_safe(
+                "".join(
+                    self.cell(capacity, leave, booked, free)
+                    for capacity, leave, booked, free in zip(
+                        row["capacity"], row["leave"], row["booked"], row["free"]
+                    )
+                )
+            )
+        return render(
+            request,
+            "projects/team_heatmap.html",
+            {
+                "date_list": dates,
+                "rows": rows,
+                "start_date": dates[0],
+                "end_date": dates[-1],
+            },
         )
-        context["the_day_before"] = the_day_before
 
-        return context
+    def cell(self, capacity, leave, booked, free):
+        """
+            case de la grille, colorée selon la part de la capacité restant libre
+        """
+        if not capacity:
+            level = "light"
+        elif free <= timedelta():
+            level = "danger"
+        elif free < capacity / 2:
+            level = "warning"
+        else:
+            level = "success"
+        return format_html(
+            '<td class="text-center table-{}" title="capacité {}, absences {}, '
+            'réservé {}">{}</td>',
+            level,
+            format_hours(capacity),
+            format_hours(leave),
+            format_hours(booked),
+            format_hours(free) if capacity or free else "",
+        )
+
+    def render_csv(self, request, dates, rows):
+        response = HttpResponse(content_type="text/csv; charset=utf-8")
+        response["Content-Disposition"] = 'attachment; filename="heatmap.csv"'
+        writer = csv.writer(response)
+        writer.writerow(["user", "date", "capacity", "leave", "booked", "free"])
+        for row in rows:
+            for i, date in enumerate(dates):
+                writer.writerow(
+                    [row["user"].username, date.isoformat()]
+                    + [
+                        format_hours(row[key][i])
+                        for key in ("capacity", "leave", "booked", "free")
+                    ]
+                )
+        return response
+
+    def render_json(self, request, dates, rows):
+        return JsonResponse(
+            {
+                "dates": [date.isoformat() for date in dates],
+                "users": [
+                    dict(
+                        {
+                            key: [hours(value) for value in row[key]]
+                            for key in ("capacity", "leave", "booked", "free")
+                        },
+                        username=row["user"].username,
+                    )
+                    for row in rows
+                ],
+            }
+        )
+
+
+class ReportView(LoginRequiredMixin, View):
+    """
+        rapport du temps passé par utilisateur, projet et période, en HTML, CSV ou
+        JSON ; paramètres GET start et end (AAAA-MM-JJ, inclus, depuis le début de
+        l'année par défaut), period (week ou month), level (niveau de l'arbre des
+        projets, 0 par défaut), user (réservé aux superutilisateurs pour un autre
+        utilisateur) et project (sous-arbre)
+    """
+
+    formats = ("html", "csv", "json")
+
+    def get(self, request, fmt="html"):
+        if fmt not in self.formats:
+            raise Http404("Format inconnu.")
+
+        end_date = date_parameter(request, "end") or timezone.now().today().date()
+        start_date = date_parameter(request, "start") or end_date.replace(
+            month=1, day=1
+        )
+        if start_date > end_date:
+            raise Http404("Période invalide.")
+
+        user = user_parameter(request)
+        report = self.get_report(
+            request,
+            start_date,
+            end_date,
+            users=None if user is None else [user],
+            root=project_parameter(request),
+        ).run()
+        return getattr(self, "render_" + fmt)(request, report)
+
+    def get_report(self, request, start_date, end_date, users, root):
+        period = request.GET.get("period", "month")
+        if period not in PERIODS:
+            raise Http404("Période invalide.")
+        try:
+            level = int(request.GET.get("level", 0))
+        except ValueError:
+            level = -1
+        if level < 0:
+            raise Http404("Niveau invalide.")
+        return PivotReport(start_date, end_date, period, level, users, root)
+
+    def render_html(self, request, report):
+        # comme pour la grille des disponibilités, les cases sont formatées ici
+        rows = []
+        for user, project, values, total in report.rows():
+            rows.append(
+                {
+                    "user": user,
+                    "project": project,
+                    "cells": mark_safe(
+                        "".join(
+                            format_html(
+                                '<td class="text-right">{}</td>',
+                                format_hours(value) if value else "",
+                            )
+                            for value in values
+                        )
+                    ),
+                    "total": format_hours(total),
+                }
+            )
+        totals, total = report.totals()
+        return render(
+            request,
+            "projects/report.html",
+            {
+                "report": report,
+                "labels": report.labels(),
+                "rows": rows,
+                "totals": [format_hours(value) for value in totals],
+                "total": format_hours(total),
+            },
+        )
+
+    def render_csv(self, request, report):
+        response = StreamingHttpResponse(
+            report.csv_lines(), content_type="text/csv; charset=utf-8"
+        )
+        response["Content-Disposition"] = 'attachment; filename="report.csv"'
+        return response
+
+    def render_json(self, request, report):
+        return JsonResponse(report.as_json())
+
+
+class PresenceReportView(ReportView):
+    """
+        jours de télétravail, de déplacement et par localisation de chaque
+        utilisateur, mois par mois, en HTML ou CSV ; paramètres GET start, end,
+        user et project comme pour le rapport par projet
+    """
+
+    formats = ("html", "csv")
+
+    def get_report(self, request, start_date, end_date, users, root):
+        return PresenceReport(start_date, end_date, users, root)
+
+    def render_html(self, request, report):
+        return render(request, "projects/presence_report.html", {"report": report})
+
+    def render_csv(self, request, report):
+        response = StreamingHttpResponse(
+            report.csv_lines(), content_type="text/csv; charset=utf-8"
+        )
+        response["Content-Disposition"] = 'attachment; filename="presence.csv"'
+        return response
 
 
 class LeaveListView(LoginRequiredMixin, ListView):
@@ -206,3 +419,28 @@ class LeaveListView(LoginRequiredMixin, ListView):
     def get_queryset(self):
         queryset = Leave.objects.filter(user=self.request.user)
         return queryset
+
+
+class ExportView(LoginRequiredMixin, View):
+    """
+        export CSV en flux des activités, absences ou capacités ; filtres GET :
+        user (réservé aux superutilisateurs pour un autre utilisateur), project,
+        start et end (AAAA-MM-JJ, inclus)
+    """
+
+    def get(self, request, kind):
+        if kind not in EXPORTS:
+            raise Http404("Export inconnu.")
+
+        queryset = export_queryset(
+            kind,
+            user_parameter(request),
+            project_parameter(request),
+            date_parameter(request, "start"),
+            date_parameter(request, "end"),
+        )
+        response = StreamingHttpResponse(
+            csv_lines(kind, queryset), content_type="text/csv; charset=utf-8"
+        )
+        response["Content-Disposition"] = 'attachment; filename="{}.csv"'.format(kind)
+        return response
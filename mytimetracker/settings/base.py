@@ -38,6 +38,7 @@ MIDDLEWARE = [
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "simple_history.middleware.HistoryRequestMiddleware",
+    "projects.middleware.SQLInstrumentationMiddleware",
 ]
 
 ROOT_URLCONF = "mytimetracker.urls"
@@ -90,5 +91,48 @@ USE_L10N = True
 
 USE_TZ = True
 
+# Cache
+# https://docs.djangoproject.com/en/2.2/topics/cache/
+# the project metrics cache is invalidated by the process handling a write, so it
+# must be shared by every web process and the metrics_worker command: file based
+# by default, memcached or database in production; with a per-process backend
+# (locmem, dummy) project metrics are computed on every request instead.
+# It holds a version key and a subtree entry per project, a dashboard per user and
+# a timesheet fragment per user and week: past MAX_ENTRIES, Django culls entries
+# at random, version keys included, and metrics_worker recomputes the whole tree
+# on every poll. MAX_ENTRIES must stay well above that count (the file based
+# backend lists its directory on every write, so large trees should use memcached
+# or the database backend with the same option)
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.path.join(BASE_DIR, "var", "cache"),
+        "OPTIONS": {"MAX_ENTRIES": 50000, "CULL_FREQUENCY": 10},
+    }
+}
+
+# SQL instrumentation
+# when enabled, every request gets a Server-Timing header and a "projects.sql" log
+# line; query shapes repeated at least SQL_INSTRUMENTATION_THRESHOLD times are
+# reported as likely N+1 patterns, with their call site
+
+SQL_INSTRUMENTATION = False
+SQL_INSTRUMENTATION_THRESHOLD = 5
+
+# History retention
+# applied by the prune_history command: saves that changed nothing are dropped,
+# then only the last HISTORY_RETENTION_KEEP versions of each object are kept
+# among those older than HISTORY_RETENTION_DAYS (None disables either limit)
+
+HISTORY_RETENTION_KEEP = 10
+HISTORY_RETENTION_DAYS = 365
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {"console": {"class": "logging.StreamHandler"}},
+    "loggers": {"projects.sql": {"handlers": ["console"], "level": "INFO"}},
+}
+
 # MPTT
 MPTT_ADMIN_LEVEL_INDENT = 20  # default is 10 pixels